@@ -0,0 +1,36 @@
+"""
+Times the background estimators available to
+`pboc_utils.phase_segmentation` and reports their largest deviation from
+the Gaussian blur on synthetic phase contrast images.
+
+Run from the `code` directory as
+
+    python benchmarks/bench_background.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pboc_utils
+from synthetic import synthetic_phase_image
+
+
+if __name__ == '__main__':
+    for size in [512, 1024, 2048]:
+        image = synthetic_phase_image(1000, size=size)
+        im_float = (image - image.min()) / (image.max() - image.min())
+        start = time.perf_counter()
+        ref = pboc_utils.estimate_background(im_float)
+        t_ref = time.perf_counter() - start
+        print('{0}x{0}: gaussian {1:.3f} s'.format(size, t_ref))
+        for method in ['fft', 'box', 'downsample']:
+            start = time.perf_counter()
+            im_blur = pboc_utils.estimate_background(im_float, method=method)
+            elapsed = time.perf_counter() - start
+            print('    {0:>10s} {1:.3f} s, speedup {2:5.1f}, '
+                  'max error {3:.1e}'.format(method, elapsed,
+                                             t_ref / elapsed,
+                                             np.abs(im_blur - ref).max()))
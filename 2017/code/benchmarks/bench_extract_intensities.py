@@ -0,0 +1,34 @@
+"""
+Times `pboc_utils.extract_features` against the original regionprops loop
+of `extract_intensities` on synthetic fields with thousands of cells. Their
+agreement is checked by test_pboc_utils.py.
+
+Run from the `code` directory as
+
+    python benchmarks/bench_extract_intensities.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pboc_utils
+from reference import extract_intensities_loop
+from synthetic import synthetic_field
+
+
+if __name__ == '__main__':
+    for num_cells in [1000, 5000, 20000]:
+        seg, fluo_im = synthetic_field(num_cells)
+        start = time.perf_counter()
+        ref = np.array([extract_intensities_loop(seg, fluo_im)
+                        for _ in range(3)])
+        t_loop = time.perf_counter() - start
+        start = time.perf_counter()
+        features = pboc_utils.extract_features(seg, [fluo_im] * 3)
+        t_vec = time.perf_counter() - start
+        print('{0:>6d} cells, 3 channels: regionprops {1:.3f} s, '
+              'bincount {2:.3f} s, speedup {3:.1f}'.format(
+                  num_cells, t_loop, t_vec, t_loop / t_vec))
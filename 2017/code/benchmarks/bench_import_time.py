@@ -0,0 +1,59 @@
+"""
+Measures how long it takes to import `pboc_utils` in a fresh interpreter,
+and how long the first call to each kind of function takes once the heavy
+dependencies it needs are loaded.
+
+Run from the `code` directory as
+
+    python benchmarks/bench_import_time.py
+
+The import is timed with `python -X importtime`, which reports the
+cumulative time spent importing each module.
+"""
+import os
+import subprocess
+import sys
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def import_time(statement, repeats=5):
+    """
+    Returns the best cumulative import time of `pboc_utils`, in seconds,
+    and the total wall time of running `statement` in a new interpreter.
+    """
+    best_import, best_total = float('inf'), float('inf')
+    for _ in range(repeats):
+        code = ('import time; start = time.perf_counter(); ' + statement
+                + '; print(time.perf_counter() - start)')
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                                 code], cwd=CODE_DIR, capture_output=True,
+                                text=True, check=True,
+                                env=dict(os.environ, MPLBACKEND='Agg'))
+        for line in result.stderr.splitlines():
+            fields = [field.strip() for field in line.split('|')]
+            if len(fields) == 3 and fields[2] == 'pboc_utils':
+                best_import = min(best_import, int(fields[1]) * 1e-6)
+        best_total = min(best_total, float(result.stdout.split()[-1]))
+    return best_import, best_total
+
+
+if __name__ == '__main__':
+    cases = [
+        ('import only', 'import pboc_utils'),
+        ('first extract_features',
+         'import numpy as np, pboc_utils; '
+         'pboc_utils.extract_features(np.ones((8, 8), int), np.ones((8, 8)))'),
+        ('first phase_segmentation',
+         'import numpy as np, pboc_utils; '
+         'pboc_utils.phase_segmentation(np.random.rand(64, 64), -0.2)'),
+        ('first bar3',
+         'import numpy as np, pboc_utils; '
+         'pboc_utils.bar3(np.random.rand(10, 10))'),
+    ]
+    print('{0:>26s} {1:>14s} {2:>12s}'.format('case', 'pboc_utils (s)',
+                                              'total (s)'))
+    for name, statement in cases:
+        t_import, t_total = import_time(statement)
+        print('{0:>26s} {1:>14.3f} {2:>12.3f}'.format(name, t_import,
+                                                      t_total))
@@ -0,0 +1,34 @@
+"""
+Times the vectorized diffusion master equation integrator against the
+loop-based version from the in-class script. Their agreement is checked by
+test_master_equation.py.
+
+Run from the `code` directory as
+
+    python benchmarks/bench_master_eq.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import master_equation
+from reference import initial_condition, master_eq_loop
+
+
+def timeit(func, num_boxes, time_points, k=1e5, dt=1e-6):
+    prob = initial_condition(num_boxes, time_points)
+    start = time.perf_counter()
+    func(prob, k, dt)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    time_points = 20
+    print('{0:>10s} {1:>12s} {2:>12s} {3:>10s}'.format(
+            'boxes', 'loop (s)', 'vector (s)', 'speedup'))
+    for num_boxes in [10**3, 10**4, 10**5]:
+        t_loop = timeit(master_eq_loop, num_boxes, time_points)
+        t_vec = timeit(master_equation.master_eq, num_boxes, time_points)
+        print('{0:>10d} {1:>12.4f} {2:>12.4f} {3:>10.1f}'.format(
+                num_boxes, t_loop, t_vec, t_loop / t_vec))
@@ -0,0 +1,31 @@
+"""
+Times the area screen in `pboc_utils.phase_segmentation` against the
+original loop over regionprops on synthetic phase contrast images with many
+cells. Their agreement is checked by test_pboc_utils.py.
+
+Run from the `code` directory as
+
+    python benchmarks/bench_phase_segmentation.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pboc_utils
+from reference import phase_segmentation_loop
+from synthetic import synthetic_phase_image
+
+
+if __name__ == '__main__':
+    for num_cells in [100, 1000, 4000]:
+        image = synthetic_phase_image(num_cells)
+        start = time.perf_counter()
+        ref = phase_segmentation_loop(image, -0.2, area_bounds=[1, 3])
+        t_loop = time.perf_counter() - start
+        start = time.perf_counter()
+        seg = pboc_utils.phase_segmentation(image, -0.2, area_bounds=[1, 3])
+        t_vec = time.perf_counter() - start
+        print('{0:>6d} cells ({1:>5d} kept): loop {2:.3f} s, '
+              'bincount {3:.3f} s, speedup {4:.1f}'.format(
+                  num_cells, seg.max(), t_loop, t_vec, t_loop / t_vec))
@@ -0,0 +1,68 @@
+"""
+Loop-based reference implementations copied from the in-class scripts. The
+benchmarks time the vectorized course code against them, and the tests check
+that both give the same results.
+"""
+import numpy as np
+import skimage.filters
+import skimage.measure
+import skimage.segmentation
+
+
+def master_eq_loop(prob, k, dt):
+    """
+    Integrates the diffusion master equation with the loop from
+    inclass/master_equation_diffusion.py.
+    """
+    num_boxes, time_points = np.shape(prob)
+    for t in range(1, time_points):
+        prob[0, t] = prob[0, t-1] - k * dt * prob[0, t-1] \
+                        + k * dt * prob[1, t-1]
+        prob[-1, t] = prob[-1, t-1] - k * dt * prob[-1, t-1] \
+                        + k * dt * prob[-2, t-1]
+        for x in range(1, num_boxes - 1):
+            prob[x, t] = prob[x, t-1] + k * dt * prob[x+1, t-1] \
+                        - 2 * k * dt * prob[x, t-1] + k * dt * prob[x-1, t-1]
+    return prob
+
+
+def initial_condition(num_boxes, time_points):
+    """
+    Makes a probability array with the particle in the middle of the
+    lattice at the first time point.
+    """
+    prob = np.zeros((num_boxes, time_points))
+    prob[num_boxes // 2, 0] = 1.0
+    return prob
+
+
+def phase_segmentation_loop(image, thresh, area_bounds=[1, 3], ip_dist=0.16):
+    """
+    Segments a phase contrast image with the original per-object area screen.
+    """
+    im_float = (image - image.min()) / (image.max() - image.min())
+    im_blur = skimage.filters.gaussian(im_float, sigma=50.0)
+    im_sub = im_float - im_blur
+    im_thresh = im_sub < thresh
+    im_lab = skimage.measure.label(im_thresh)
+    props = skimage.measure.regionprops(im_lab)
+    approved_objects = np.zeros_like(im_lab)
+    for labeled_obj in props:
+        area = labeled_obj.area * ip_dist**2
+        if (area > area_bounds[0]) & (area < area_bounds[1]):
+            approved_objects += (im_lab == labeled_obj.label)
+    im_border = skimage.segmentation.clear_border(approved_objects)
+    final_seg = skimage.measure.label(im_border)
+    return final_seg
+
+
+def extract_intensities_loop(seg, fluo_im):
+    """
+    Computes the mean intensity of each cell with the original regionprops
+    loop.
+    """
+    props = skimage.measure.regionprops(seg, intensity_image=fluo_im)
+    cell_ints = []
+    for labeled_obj in props:
+        cell_ints.append(labeled_obj.mean_intensity)
+    return np.array(cell_ints)
@@ -0,0 +1,122 @@
+"""
+Runs the benchmark suite and writes a machine-readable report of the run
+time and peak memory of every kernel at every problem size.
+
+Usage
+-----
+    python benchmarks/run_benchmarks.py --output report.json
+    python benchmarks/run_benchmarks.py --filter master_eq poisson --quick
+
+The report is a JSON file with information about the machine and the code
+version, and one entry per benchmark and parameter combination giving the
+minimum and median run time in seconds over the repeats and the peak memory
+allocated during a single run, in bytes.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import suite
+
+
+def git_revision():
+    """
+    Returns the current git commit, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(kernel, repeat):
+    """
+    Times a kernel and measures the peak memory it allocates.
+
+    Returns
+    -------
+    times : list of float
+        Wall time of each repeat in seconds.
+    peak_bytes : int
+        Peak memory traced by tracemalloc during one run, which includes
+        numpy array allocations.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        kernel()
+        times.append(time.perf_counter() - start)
+    # Memory tracing slows the kernel down, so it gets a run of its own.
+    gc.collect()
+    tracemalloc.start()
+    kernel()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return times, peak_bytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', default=None,
+                        help='path of the JSON report (default: stdout only)')
+    parser.add_argument('--filter', nargs='+', default=None,
+                        help='only run benchmarks whose names contain one '
+                             'of these strings')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs of each kernel')
+    parser.add_argument('--quick', action='store_true',
+                        help='only run the smallest problem size of each '
+                             'benchmark')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, func, params in suite.BENCHMARKS:
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        if args.quick:
+            params = {key: values[:1] for key, values in params.items()}
+        for combo in suite.combinations(params):
+            kernel = func(**combo)
+            times, peak_bytes = measure(kernel, args.repeat)
+            result = {'name': name, 'params': combo,
+                      'min_s': min(times),
+                      'median_s': statistics.median(times),
+                      'peak_bytes': peak_bytes}
+            results.append(result)
+            print('{0:<22s} {1:<45s} {2:>10.4f} s {3:>10.1f} MB'.format(
+                    name, ', '.join('{0}={1}'.format(*item)
+                                    for item in sorted(combo.items())),
+                    result['min_s'], peak_bytes / 2**20))
+            sys.stdout.flush()
+
+    report = {'timestamp': datetime.datetime.now().isoformat(),
+              'commit': git_revision(),
+              'machine': {'platform': platform.platform(),
+                          'processor': platform.processor(),
+                          'python': platform.python_version(),
+                          'numpy': np.__version__},
+              'repeat': args.repeat,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Benchmarks of the numerical kernels in the course code, run by
+run_benchmarks.py.
+
+Each benchmark is a function registered with `benchmark`, listing the
+problem sizes to try as keyword arguments. It does any setup, such as making
+synthetic data, and returns a function of no arguments that runs the kernel
+once. Only the returned function is timed.
+"""
+import itertools
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import frap
+import growth
+import master_equation
+import pboc_utils
+import smfish
+import stochastic
+from synthetic import (synthetic_field, synthetic_growth_curves,
+                       synthetic_phase_image, synthetic_smfish)
+
+BENCHMARKS = []
+
+
+def benchmark(**params):
+    """
+    Registers a benchmark to be run for every combination of the given
+    parameter values.
+    """
+    def register(func):
+        BENCHMARKS.append((func.__name__, func, params))
+        return func
+    return register
+
+
+def combinations(params):
+    """
+    Yields a dictionary for every combination of parameter values.
+    """
+    names = sorted(params)
+    for values in itertools.product(*[params[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+@benchmark(num_boxes=[100, 1000, 10000, 100000], time_points=[100, 1000])
+def master_eq(num_boxes, time_points):
+    k, dt = 1e5, 1e-6
+    prob = np.zeros((num_boxes, time_points))
+    prob[num_boxes // 2, 0] = 1
+    return lambda: master_equation.master_eq(prob, k, dt)
+
+
+@benchmark(upper_bound=[20, 200, 2000], time_points=[400, 4000])
+def mrna_euler(upper_bound, time_points):
+    model = master_equation.mrna_model(2, 1 / 3, upper_bound)
+    # dt small enough to stay stable at the largest copy number
+    dt = 0.5 / (2 + upper_bound / 3)
+    p0 = model.initial()
+    return lambda: master_equation.collect(model.stream(p0, dt, time_points))
+
+
+@benchmark(tot_length=[30, 300, 3000], tot_time=[2000])
+def polymer_euler(tot_length, tot_time):
+    model = master_equation.polymer_model(0.7, 0.3, tot_length,
+                                          length_dependent=True)
+    dt = 0.5 / (0.7 + 0.3 * tot_length)
+    p0 = model.initial()
+    return lambda: master_equation.collect(model.stream(p0, dt, tot_time))
+
+
+@benchmark(upper_bound=[200, 2000, 20000], num_times=[10])
+def mrna_expm(upper_bound, num_times):
+    model = master_equation.mrna_model(2, 1 / 3, upper_bound)
+    times = np.linspace(0, 20, num_times)
+    p0 = model.initial()
+    return lambda: model.solve(p0, times)
+
+
+@benchmark(num_states=[1000, 100000, 1000000])
+def steady_state(num_states):
+    model = master_equation.mrna_model(2, 1 / 3, num_states - 1)
+    return model.steady_state
+
+
+@benchmark(num_params=[100, 10000], upper_bound=[20])
+def mrna_sweep(num_params, upper_bound):
+    side = int(np.sqrt(num_params))
+    r = np.linspace(0.5, 2, side)[:, np.newaxis]
+    gamma = np.linspace(0.2, 1, side)[np.newaxis, :]
+    return lambda: master_equation.mrna_sweep(r, gamma, upper_bound, 0.02,
+                                              400, stride=100)
+
+
+@benchmark(num_means=[1, 1000, 100000], length=[100])
+def poisson_dist(num_means, length):
+    means = np.linspace(0.5, 50, num_means)
+    return lambda: smfish.poisson_dist(means, length)
+
+
+@benchmark(model=['poisson', 'negative_binomial', 'telegraph'])
+def fit_distribution(model):
+    prob, err = synthetic_smfish()
+    return lambda: smfish.fit_distribution(prob, err, model=model)
+
+
+@benchmark(size=[512, 1024, 2048], num_cells=[1000])
+def phase_segmentation(size, num_cells):
+    image = synthetic_phase_image(num_cells, size=size)
+    return lambda: pboc_utils.phase_segmentation(image, -0.2)
+
+
+@benchmark(size=[512, 1024, 2048],
+           method=['gaussian', 'fft', 'box', 'downsample'])
+def estimate_background(size, method):
+    image = synthetic_phase_image(1000, size=size)
+    im_float = (image - image.min()) / (image.max() - image.min())
+    return lambda: pboc_utils.estimate_background(im_float, method=method)
+
+
+@benchmark(num_cells=[1000, 10000], num_channels=[1, 3])
+def extract_features(num_cells, num_channels):
+    seg, fluo_im = synthetic_field(num_cells)
+    return lambda: pboc_utils.extract_features(seg, [fluo_im] * num_channels)
+
+
+@benchmark(num_curves=[1, 10000, 1000000])
+def fit_growth_rate(num_curves):
+    time, log_area = synthetic_growth_curves(num_curves)
+    return lambda: growth.fit_growth_rate(time, log_area)
+
+
+@benchmark(num_curves=[1, 10000], num_slopes=[50, 1000])
+def residual_surface(num_curves, num_slopes):
+    time, log_area = synthetic_growth_curves(num_curves)
+    slopes = np.linspace(0.02, 0.045, num_slopes)
+    return lambda: growth.residual_surface(time, log_area, slopes)
+
+
+@benchmark(num_cells=[1000, 100000])
+def gillespie(num_cells):
+    stoich, propensity = stochastic.mrna_reactions(2, 1 / 3)
+    times = np.linspace(0, 20, 21)
+    return lambda: stochastic.gillespie(stoich, propensity, [0], times,
+                                        num_cells=num_cells, seed=0)
+
+
+@benchmark(num_walkers=[10000, 1000000], num_boxes=[15, 101])
+def random_walk(num_walkers, num_boxes):
+    p0 = np.zeros(num_boxes)
+    p0[num_boxes // 2] = 1
+    return lambda: stochastic.random_walk(p0, 1e5, 1e-6, 200, num_walkers,
+                                          stride=10, seed=0)
+
+
+@benchmark(size=[64, 256], time_points=[1000])
+def frap_stencil(size, time_points):
+    y, x = np.mgrid[0:size, 0:size]
+    center = size / 2
+    mask = (x - center)**2 + (y - center)**2 < (0.45 * size)**2
+    bleach = (x - center)**2 + (y - center)**2 < (0.1 * size)**2
+    return lambda: frap.frap(mask, bleach, 1.0, 0.2, time_points, stride=100)
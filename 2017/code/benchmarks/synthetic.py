@@ -0,0 +1,72 @@
+"""
+Generators of synthetic data for the benchmarks, so that no real microscopy
+or smFISH data is needed to measure performance.
+"""
+import numpy as np
+
+
+def synthetic_phase_image(num_cells, size=1024, seed=42):
+    """
+    Makes a phase contrast-like image of dark rectangular cells of varying
+    size on a bright, slightly uneven background.
+    """
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:size, 0:size]
+    image = 1000 + 100 * np.sin(x / size * np.pi) + rng.normal(0, 5,
+                                                           (size, size))
+    # place cells on a jittered grid so that they do not overlap
+    grid = int(np.ceil(np.sqrt(num_cells)))
+    spacing = size // grid
+    for i in range(num_cells):
+        row, col = divmod(i, grid)
+        height, width = rng.randint(3, min(spacing - 2, 16), size=2)
+        top = row * spacing + 1
+        left = col * spacing + 1
+        image[top:top + height, left:left + width] = 300
+    return image
+
+
+def synthetic_field(num_cells, size=2048, seed=42):
+    """
+    Makes a segmentation mask of non-overlapping rectangular cells and a
+    fluorescence image with a different brightness for each cell.
+    """
+    rng = np.random.RandomState(seed)
+    seg = np.zeros((size, size), dtype=int)
+    grid = int(np.ceil(np.sqrt(num_cells)))
+    spacing = size // grid
+    for i in range(num_cells):
+        row, col = divmod(i, grid)
+        height, width = rng.randint(3, spacing - 1, size=2)
+        top, left = row * spacing, col * spacing
+        seg[top:top + height, left:left + width] = i + 1
+    fluo_im = rng.poisson(100 + 10 * (seg % 50)).astype(np.uint16)
+    return seg, fluo_im
+
+
+def synthetic_growth_curves(num_curves, num_times=20, interval=5, seed=42):
+    """
+    Makes noisy normalized log-area growth curves with growth rates around
+    0.03 per minute.
+    """
+    rng = np.random.RandomState(seed)
+    time = np.arange(num_times) * interval
+    rates = rng.uniform(0.02, 0.045, size=(num_curves, 1))
+    log_area = rates * time + rng.normal(0, 0.05, (num_curves, num_times))
+    return time, log_area
+
+
+def synthetic_smfish(mean=10, burst_size=3, length=60, num_cells=500,
+                     seed=42):
+    """
+    Makes a measured copy number distribution and error bars by sampling
+    cells from a negative binomial distribution.
+    """
+    rng = np.random.RandomState(seed)
+    burst_freq = mean / burst_size
+    counts = rng.negative_binomial(burst_freq, 1 / (1 + burst_size),
+                                   size=num_cells)
+    prob = np.bincount(np.minimum(counts, length - 1),
+                       minlength=length) / num_cells
+    err = np.sqrt(prob * (1 - prob) / num_cells)
+    return prob, err
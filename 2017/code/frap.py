@@ -0,0 +1,434 @@
+"""
+Diffusion on two- and three-dimensional lattices and simulation of
+Fluorescence Recovery After Photobleaching (FRAP) experiments for the
+physical biology of the cell course at Cold Spring Harbor Laboratories.
+
+The in-class script master_equation_diffusion.py bleaches a few boxes of a
+one-dimensional cell. Here the cell can be any shape on a lattice of any
+dimension, given as a boolean mask that is True inside the cell. Molecules
+hop to each neighboring site inside the cell at rate k; hops that would
+leave the cell are reflected, so no molecules are lost at the membrane.
+"""
+import numpy as np
+import scipy.fft
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+
+import instrument
+import master_equation
+
+
+def _neighbor_masks(mask):
+    """
+    For every axis, returns masks of the sites that can hop in the negative
+    and positive direction, i.e. whose neighbor in that direction is also in
+    the cell.
+    """
+    masks = []
+    for axis in range(mask.ndim):
+        minus = np.zeros_like(mask)
+        plus = np.zeros_like(mask)
+        inner = [slice(None)] * mask.ndim
+        outer = [slice(None)] * mask.ndim
+        inner[axis] = slice(1, None)
+        outer[axis] = slice(None, -1)
+        both = mask[tuple(inner)] & mask[tuple(outer)]
+        minus[tuple(inner)] = both
+        plus[tuple(outer)] = both
+        masks.append((minus, plus))
+    return masks
+
+
+def lattice_stepper(mask, k, dt):
+    """
+    Makes a function that performs one forward Euler step of the diffusion
+    master equation on an N-dimensional lattice with reflecting cell
+    boundaries, for use with `master_equation.stream`.
+
+    Parameters
+    ----------
+    mask : nd-array of bool
+        True at the lattice sites inside the cell.
+    k : float
+        Hopping rate to each neighboring site in units of 1/s.
+    dt : float
+        Time step. For stability 2 * ndim * k * dt must be at most 1.
+
+    Returns
+    -------
+    step : function
+        Function with signature step(prob, out) that writes the field one
+        time step after `prob` into `out` and returns `out`.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    hop_masks = _neighbor_masks(mask)
+    # Number of neighbors each site can hop to sets how fast it loses
+    # probability. This is what makes the cell boundary reflecting.
+    num_neighbors = sum(minus.astype(int) + plus for minus, plus in hop_masks)
+    stay = 1 - k * dt * num_neighbors
+    hop_in = [(k * dt * minus, k * dt * plus) for minus, plus in hop_masks]
+
+    def step(prob, out):
+        np.multiply(stay, prob, out=out)
+        for axis, (from_minus, from_plus) in enumerate(hop_in):
+            inner = [slice(None)] * prob.ndim
+            outer = [slice(None)] * prob.ndim
+            inner[axis] = slice(1, None)
+            outer[axis] = slice(None, -1)
+            # Sites receive from their neighbor on each side if that
+            # neighbor is allowed to hop towards them.
+            out[tuple(inner)] += from_plus[tuple(outer)] * prob[tuple(outer)]
+            out[tuple(outer)] += from_minus[tuple(inner)] * prob[tuple(inner)]
+        return out
+    return step
+
+
+def lattice_generator(mask, k):
+    """
+    Builds the sparse generator of diffusion among the sites inside the cell.
+
+    Parameters
+    ----------
+    mask : nd-array of bool
+        True at the lattice sites inside the cell.
+    k : float
+        Hopping rate to each neighboring site in units of 1/s.
+
+    Returns
+    -------
+    generator : scipy.sparse.csr_matrix
+        Generator acting on the values at the cell sites, taken in the order
+        of mask.ravel().
+    """
+    mask = np.asarray(mask, dtype=bool)
+    index = -np.ones(mask.shape, dtype=int)
+    index[mask] = np.arange(np.count_nonzero(mask))
+    rows, cols = [], []
+    # Each pair of neighboring sites in the cell exchanges molecules at
+    # rate k in both directions.
+    for axis, (minus, plus) in enumerate(_neighbor_masks(mask)):
+        neighbor = np.roll(index, -1, axis=axis)
+        src = index[plus]
+        dst = neighbor[plus]
+        rows += [dst, src]
+        cols += [src, dst]
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    num_sites = np.count_nonzero(mask)
+    hops = scipy.sparse.csr_matrix((k * np.ones(len(rows)), (rows, cols)),
+                                   shape=(num_sites, num_sites))
+    loss = np.asarray(hops.sum(axis=0)).ravel()
+    return hops - scipy.sparse.diags(loss)
+
+
+def dct_propagate(field, k, times):
+    """
+    Propagates a field on a rectangular lattice with reflecting walls to the
+    given times exactly, using the discrete cosine transform, which
+    diagonalizes the reflecting diffusion operator.
+
+    Parameters
+    ----------
+    field : nd-array
+        Field at time zero on the full rectangular lattice.
+    k : float
+        Hopping rate to each neighboring site in units of 1/s.
+    times : 1d-array
+        Times at which to report the field.
+
+    Yields
+    ------
+    t : float
+        Time of the snapshot.
+    field : nd-array
+        Field at time t.
+    """
+    field = np.asarray(field, dtype=float)
+    # This is a generator, so each stage is timed separately rather than
+    # around a yield.
+    with instrument.timer('dct_propagate.transform', field.nbytes):
+        modes = scipy.fft.dctn(field, type=2, norm='ortho')
+    # Eigenvalue of each mode is the sum over axes of -2k(1 - cos(pi j / N)).
+    rate = np.zeros(field.shape)
+    for axis, n in enumerate(field.shape):
+        shape = [1] * field.ndim
+        shape[axis] = n
+        j = np.arange(n).reshape(shape)
+        rate = rate - 2 * k * (1 - np.cos(np.pi * j / n))
+    for t in times:
+        with instrument.timer('dct_propagate.snapshot', field.nbytes):
+            snapshot = scipy.fft.idctn(modes * np.exp(rate * t), type=2,
+                                       norm='ortho')
+        yield t, snapshot
+
+
+@instrument.timed()
+def frap(mask, bleach, k, dt, time_points, stride=1, method='stencil',
+         return_fields=False):
+    """
+    Simulates a FRAP experiment and returns the recovery curve.
+
+    Before bleaching, the fluorescent molecules are spread uniformly over the
+    cell with one molecule per site on average. Bleaching removes every
+    fluorescent molecule in the bleach region, and the recovery curve is the
+    mean fluorescence per site in the bleach region over time, relative to
+    its value before bleaching.
+
+    Parameters
+    ----------
+    mask : nd-array of bool
+        True at the lattice sites inside the cell.
+    bleach : nd-array of bool
+        True at the lattice sites that are bleached. Only sites inside the
+        cell are used.
+    k : float
+        Hopping rate to each neighboring site in units of 1/s.
+    dt : float
+        Time step for the integration.
+    time_points : int
+        Total number of time points, including the moment of bleaching.
+    stride : int, default 1
+        Record the recovery every `stride` time points.
+    method : str, default 'stencil'
+        'stencil' integrates with forward Euler steps on any cell shape.
+        'dct' propagates exactly with cosine transforms, and requires the
+        cell to fill the whole rectangular lattice.
+    return_fields : bool, default False
+        If True, also return the fluorescence field at each recorded time.
+
+    Returns
+    -------
+    time_vec : 1d-array
+        Times at which the recovery was recorded.
+    recovery : 1d-array
+        Mean fluorescence in the bleach region relative to before bleaching.
+        It approaches the fraction of molecules left unbleached.
+    fields : list of nd-array
+        Fluorescence field at each recorded time. Only returned if
+        `return_fields` is True.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    bleach = np.asarray(bleach, dtype=bool) & mask
+    if not np.any(bleach):
+        raise ValueError('The bleach region does not overlap the cell.')
+    field = mask.astype(float)
+    field[bleach] = 0
+
+    if method == 'stencil':
+        if 2 * mask.ndim * k * dt > 1:
+            raise ValueError('dt is too large for a stable Euler step; '
+                             '2 * ndim * k * dt must be at most 1.')
+        snapshots = master_equation.stream(lattice_stepper(mask, k, dt),
+                                           field, dt, time_points,
+                                           stride=stride)
+    elif method == 'dct':
+        if not np.all(mask):
+            raise ValueError("method 'dct' requires mask to fill the "
+                             "whole lattice.")
+        snapshots = dct_propagate(field, k,
+                                  np.arange(0, time_points, stride) * dt)
+    else:
+        raise ValueError("method must be 'stencil' or 'dct'.")
+
+    time_vec, recovery, fields = [], [], []
+    for t, snapshot in snapshots:
+        time_vec.append(t)
+        recovery.append(snapshot[bleach].mean())
+        if return_fields:
+            fields.append(snapshot)
+    if return_fields:
+        return np.array(time_vec), np.array(recovery), fields
+    return np.array(time_vec), np.array(recovery)
+
+
+class RecoveryModel(object):
+    """
+    Fast FRAP recovery curves for a fixed cell shape and set of bleach
+    regions, for any hopping rate.
+
+    The diffusion generator for hopping rate k is k times the generator for
+    k = 1, so its eigenvectors do not depend on k and its eigenvalues are
+    just rescaled. Once the eigendecomposition is computed for the
+    geometry, the recovery curve of each bleach region is a sum of decaying
+    exponentials, r(t) = sum_j w_j exp(lambda_j k t), which can be evaluated
+    for many values of k and t at once.
+
+    Parameters
+    ----------
+    mask : nd-array of bool
+        True at the lattice sites inside the cell.
+    bleach : nd-array of int or bool, or list of nd-array of bool
+        Either a label image in which each bleach region has its own
+        positive label (0 is not bleached), a single boolean mask, or a list
+        of boolean masks. Each region is treated as a separate experiment on
+        the same cell.
+    num_modes : int, optional
+        Number of slowest modes to keep. By default all modes are computed
+        with a dense eigendecomposition, which is practical up to a few
+        thousand sites. For larger cells, keeping a few hundred slow modes
+        uses a sparse solver and is accurate except at the earliest times.
+
+    Attributes
+    ----------
+    eigenvalues : 1d-array
+        Eigenvalues of the generator for k = 1.
+    weights : 2d-array
+        Regions x modes array of the weight of each mode in each recovery
+        curve.
+    """
+    def __init__(self, mask, bleach, num_modes=None):
+        mask = np.asarray(mask, dtype=bool)
+        if isinstance(bleach, np.ndarray) and bleach.dtype != bool:
+            labels = np.unique(bleach[bleach > 0])
+            regions = [bleach == label for label in labels]
+        elif isinstance(bleach, np.ndarray) and bleach.shape == mask.shape:
+            # a single boolean mask, as passed to `frap`
+            regions = [bleach]
+        else:
+            regions = [np.asarray(region, dtype=bool) for region in bleach]
+        # Indicator of each bleach region on the cell sites, regions x sites.
+        indicator = np.array([region[mask] for region in regions],
+                             dtype=float)
+        size = indicator.sum(axis=1)
+        if np.any(size == 0):
+            raise ValueError('Every bleach region must overlap the cell.')
+
+        generator = lattice_generator(mask, 1.0)
+        num_sites = generator.shape[0]
+        if num_modes is None or num_modes >= num_sites - 1:
+            eigenvalues, modes = scipy.linalg.eigh(generator.toarray())
+        else:
+            # Shift-invert about a point just above zero finds the slowest
+            # modes of the (negative semi-definite) generator.
+            eigenvalues, modes = scipy.sparse.linalg.eigsh(
+                    generator.tocsc(), k=num_modes, sigma=1e-6, which='LM')
+
+        # For region B, the field right after bleaching is 1 on the cell
+        # minus the indicator of B, and the recovery is the mean of the
+        # field over B:
+        #   r(t) = sum_j (1_B . v_j) (v_j . (1 - 1_B)) exp(lambda_j t) / |B|
+        overlap = indicator.dot(modes)
+        cell_overlap = modes.sum(axis=0)
+        self.eigenvalues = eigenvalues
+        self.weights = overlap * (cell_overlap - overlap) \
+                       / size[:, np.newaxis]
+        self.num_regions = len(regions)
+
+    def curves(self, k, times):
+        """
+        Computes the recovery curve of every region for every hopping rate.
+
+        Parameters
+        ----------
+        k : float or 1d-array
+            Hopping rates in units of 1/s.
+        times : 1d-array
+            Times at which to evaluate the curves.
+
+        Returns
+        -------
+        recovery : nd-array
+            Array of shape regions x len(k) x len(times), with the middle
+            axis dropped if k is a scalar.
+        """
+        k_arr = np.atleast_1d(np.asarray(k, dtype=float))
+        times = np.asarray(times, dtype=float)
+        # modes x (k x times) decay factors, then one matrix product.
+        decay = np.exp(self.eigenvalues[:, np.newaxis]
+                       * (k_arr[:, np.newaxis] * times).ravel())
+        recovery = self.weights.dot(decay).reshape(
+                (self.num_regions, len(k_arr), len(times)))
+        return recovery[:, 0] if np.ndim(k) == 0 else recovery
+
+    def fit(self, times, data, k_grid=None):
+        """
+        Fits the hopping rate of every region by least squares.
+
+        The misfit of every region is evaluated on a logarithmic grid of
+        hopping rates in one vectorized call, and the best grid point is
+        refined by fitting a parabola through it and its neighbors in log k.
+
+        Parameters
+        ----------
+        times : 1d-array
+            Times of the measurements, with t = 0 at bleaching.
+        data : 2d-array
+            Regions x len(times) array of measured recovery, normalized to
+            the fluorescence in each region before bleaching.
+        k_grid : 1d-array, optional
+            Candidate hopping rates. Defaults to 200 rates spaced
+            logarithmically across the range set by the slowest and fastest
+            modes and the span of the measurement times.
+
+        Returns
+        -------
+        k : 1d-array
+            Best fit hopping rate of each region.
+        sum_sq_residuals : 1d-array
+            Misfit of each region at its best fit rate.
+        """
+        times = np.asarray(times, dtype=float)
+        data = np.atleast_2d(np.asarray(data, dtype=float))
+        if k_grid is None:
+            rates = -self.eigenvalues[self.eigenvalues < -1e-12]
+            t_span = times.max() - times[times > 0].min() \
+                     if np.sum(times > 0) > 1 else times.max()
+            k_grid = np.logspace(np.log10(0.01 / (rates.max()
+                                                  * times.max())),
+                                 np.log10(100 / (rates.min() * t_span)),
+                                 200)
+        log_k = np.log(k_grid)
+        misfit = np.sum((self.curves(k_grid, times)
+                         - data[:, np.newaxis, :])**2, axis=-1)
+        best = np.clip(np.argmin(misfit, axis=1), 1, len(k_grid) - 2)
+        regions = np.arange(self.num_regions)
+
+        # Vertex of the parabola through the best point and its neighbors.
+        y0, y1, y2 = misfit[regions, best - 1], misfit[regions, best], \
+                     misfit[regions, best + 1]
+        x0, x1, x2 = log_k[best - 1], log_k[best], log_k[best + 1]
+        denom = (x0 - x1) * (x0 - x2) * (x1 - x2)
+        a = (x2 * (y1 - y0) + x1 * (y0 - y2) + x0 * (y2 - y1)) / denom
+        b = (x2**2 * (y0 - y1) + x1**2 * (y2 - y0) + x0**2 * (y1 - y2)) \
+            / denom
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vertex = np.where(a > 0, -b / (2 * a), x1)
+        k_fit = np.exp(np.clip(vertex, x0, x2))
+        curves = np.array([self.curves(k_fit[i], times)[i]
+                           for i in regions])
+        return k_fit, np.sum((curves - data)**2, axis=-1)
+
+
+@instrument.timed()
+def fit_recovery(cells, times, dx=1.0, num_modes=None):
+    """
+    Fits diffusion constants to the FRAP recovery curves of many cells.
+
+    Parameters
+    ----------
+    cells : list of tuple
+        One (mask, bleach, data) tuple per cell, where `mask` and `bleach`
+        are as for `RecoveryModel` and `data` is the regions x len(times)
+        array of measured recovery curves.
+    times : 1d-array
+        Times of the measurements, with t = 0 at bleaching.
+    dx : float, default 1.0
+        Lattice spacing, e.g. the pixel size in microns.
+    num_modes : int, optional
+        Number of slowest modes to keep, see `RecoveryModel`.
+
+    Returns
+    -------
+    D : list of 1d-array
+        Diffusion constant of each region of each cell, D = k * dx**2.
+    sum_sq_residuals : list of 1d-array
+        Misfit of each region of each cell.
+    """
+    D, sum_sq_residuals = [], []
+    for mask, bleach, data in cells:
+        model = RecoveryModel(mask, bleach, num_modes=num_modes)
+        k, misfit = model.fit(times, data)
+        D.append(k * dx**2)
+        sum_sq_residuals.append(misfit)
+    return D, sum_sq_residuals
@@ -0,0 +1,201 @@
+"""
+Functions for measuring bacterial growth from time-lapse microscopy in the
+physical biology of the cell course at Cold Spring Harbor Laboratories.
+"""
+import collections
+import concurrent.futures
+import glob
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+import skimage.io
+
+import instrument
+
+
+def frame_index(path):
+    """
+    Returns the frame number at the end of a file name such as
+    'ecoli_TRITC_18.tif'.
+    """
+    match = re.search(r'(\d+)\D*$', os.path.basename(path))
+    if match is None:
+        raise ValueError('No frame number in file name ' + path)
+    return int(match.group(1))
+
+
+def sorted_frames(pattern):
+    """
+    Returns the files matching a glob pattern in order of their frame number
+    rather than the arbitrary (or alphabetical, putting 10 before 2) order
+    returned by glob.
+    """
+    return sorted(glob.glob(pattern), key=frame_index)
+
+
+def frame_area(path, thresh=0.4):
+    """
+    Reads a fluorescence image, rescales it to intensities from 0 to 1 and
+    returns the number of pixels above the threshold.
+
+    Parameters
+    ----------
+    path : str
+        Path to the image file.
+    thresh : float, default 0.4
+        Threshold on the rescaled intensity above which a pixel is counted
+        as part of a cell.
+
+    Returns
+    -------
+    area : int
+        Bacterial area of the frame in square pixels.
+    read_time, process_time : float
+        Wall time in seconds spent reading the image and thresholding it.
+    """
+    start = time.perf_counter()
+    im = skimage.io.imread(path)
+    read_time = time.perf_counter() - start
+    instrument.count('frame_area.imread', nbytes=im.nbytes, seconds=read_time)
+
+    start = time.perf_counter()
+    im_min, im_max = im.min(), im.max()
+    # Thresholding the rescaled image is the same as thresholding the raw
+    # image at the corresponding raw value, which avoids a float copy.
+    area = int(np.count_nonzero(im > im_min + thresh * (im_max - im_min)))
+    process_time = time.perf_counter() - start
+    instrument.count('frame_area.threshold', nbytes=im.nbytes,
+                     seconds=process_time)
+    return area, read_time, process_time
+
+
+def batch_areas(pattern, thresh=0.4, interval=5, processes=None,
+                prefetch=None):
+    """
+    Measures the bacterial area in every frame of a time-lapse, reading and
+    thresholding the frames in a pool of worker processes.
+
+    Parameters
+    ----------
+    pattern : str
+        Glob pattern matching the image files, e.g.
+        '../data/ecoli_growth/ecoli_TRITC_*.tif'.
+    thresh : float, default 0.4
+        Threshold on the rescaled intensity, see `frame_area`.
+    interval : float, default 5
+        Time between frames in minutes.
+    processes : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    prefetch : int, optional
+        Maximum number of frames submitted to the pool but not yet
+        collected. Defaults to twice the number of workers, which keeps every
+        worker busy while bounding the number of images held in memory.
+
+    Returns
+    -------
+    df : pandas DataFrame
+        One row per frame, in frame order, with columns 'frame', 'time',
+        'area', 'read_time' and 'process_time'.
+    """
+    paths = sorted_frames(pattern)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if prefetch is None:
+        prefetch = 2 * processes
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        pending = collections.deque()
+        for path in paths:
+            # Wait for the oldest frame before submitting more than
+            # `prefetch` frames, so reading and thresholding overlap without
+            # queueing up the whole movie.
+            if len(pending) >= prefetch:
+                results.append(pending.popleft().result())
+            pending.append(pool.submit(frame_area, path, thresh))
+        while pending:
+            results.append(pending.popleft().result())
+
+    frames = np.array([frame_index(path) for path in paths], dtype=int)
+    df = pd.DataFrame(results, columns=['area', 'read_time',
+                                        'process_time'])
+    df.insert(0, 'frame', frames)
+    df.insert(1, 'time', frames * interval)
+    return df
+
+
+def fit_growth_rate(time, log_area, intercept=False):
+    """
+    Finds the exponential growth rate by least squares in closed form.
+
+    Parameters
+    ----------
+    time : 1d-array
+        Time points of length T.
+    log_area : nd-array
+        Log of the area at each time point, with time along the last axis.
+        Passing an M x T array fits M growth curves at once.
+    intercept : bool, default False
+        If False, fits log_area = k * time, which assumes the curves have
+        been normalized as log(A_t) - log(A_0). If True, fits
+        log_area = b + k * time.
+
+    Returns
+    -------
+    k : float or nd-array
+        Growth rate of each curve, in inverse units of `time`.
+    b : float or nd-array
+        Intercept of each curve. Only returned if `intercept` is True.
+    """
+    time = np.asarray(time, dtype=float)
+    log_area = np.asarray(log_area, dtype=float)
+    if not intercept:
+        # Setting the derivative of sum (y - k t)^2 with respect to k to
+        # zero gives k = sum(t y) / sum(t^2).
+        return log_area.dot(time) / time.dot(time)
+    t_mean = time.mean()
+    y_mean = log_area.mean(axis=-1)
+    t_centered = time - t_mean
+    k = log_area.dot(t_centered) / t_centered.dot(t_centered)
+    return k, y_mean - k * t_mean
+
+
+def residual_surface(time, log_area, slopes):
+    """
+    Computes the sum of squared residuals of log_area = k * time for every
+    candidate slope k, as in the in-class grid search, without looping.
+
+    Parameters
+    ----------
+    time : 1d-array
+        Time points of length T.
+    log_area : nd-array
+        Log of the area at each time point, with time along the last axis.
+    slopes : 1d-array
+        Candidate growth rates.
+
+    Returns
+    -------
+    sum_sq_residuals : nd-array
+        Array of shape log_area.shape[:-1] + (len(slopes),).
+    """
+    time = np.asarray(time, dtype=float)
+    log_area = np.asarray(log_area, dtype=float)
+    slopes = np.asarray(slopes, dtype=float)
+    # Expanding the square, sum (y - k t)^2 = sum y^2 - 2 k sum t y
+    # + k^2 sum t^2, so only three sums over time are needed for any number
+    # of slopes.
+    sum_yy = np.sum(log_area**2, axis=-1)[..., np.newaxis]
+    sum_ty = log_area.dot(time)[..., np.newaxis]
+    sum_tt = time.dot(time)
+    return sum_yy - 2 * slopes * sum_ty + slopes**2 * sum_tt
+
+
+def doubling_time(k):
+    """
+    Returns the doubling time ln(2) / k for a growth rate k.
+    """
+    return np.log(2) / k
@@ -0,0 +1,133 @@
+"""
+A memory-mapped store for time-lapse microscopy images used in the physical
+biology of the cell course at Cold Spring Harbor Laboratories.
+
+Reading a movie one TIFF at a time means decoding every file on every run.
+`pack_stack` reads the TIFFs once and writes all of them into a single
+uncompressed .npy array of shape (channels, frames, rows, cols) next to a
+JSON index describing the channels, frame numbers and times. `ImageStack`
+then reopens the array as a memory map, so each frame is a contiguous block
+on disk that can be sliced without copying or decoding.
+"""
+import json
+
+import numpy as np
+import skimage.io
+
+import growth
+
+
+def pack_stack(channels, output, interval=5):
+    """
+    Packs the TIFF images of one or more channels into a single memory-mapped
+    array file.
+
+    Parameters
+    ----------
+    channels : dict
+        Dictionary mapping channel names to glob patterns of the image files,
+        e.g. {'phase': 'ecoli_phase_*.tif', 'TRITC': 'ecoli_TRITC_*.tif'}.
+        Every channel must contain the same frame numbers.
+    output : str
+        Path of the array file to write. The index is written to the same
+        path with the extension replaced by .json.
+    interval : float, default 5
+        Time between frames in minutes.
+
+    Returns
+    -------
+    stack : ImageStack
+        The newly written stack, opened for reading.
+    """
+    names = list(channels)
+    paths = {name: growth.sorted_frames(channels[name]) for name in names}
+    frames = [growth.frame_index(path) for path in paths[names[0]]]
+    if len(frames) == 0:
+        raise ValueError('No images match ' + channels[names[0]])
+    for name in names[1:]:
+        if [growth.frame_index(path) for path in paths[name]] != frames:
+            raise ValueError('Channel ' + name + ' does not have the same '
+                             'frames as channel ' + names[0])
+
+    # Use the first image to fix the shape and type of the whole stack.
+    first = skimage.io.imread(paths[names[0]][0])
+    shape = (len(names), len(frames)) + first.shape
+    if not output.endswith('.npy'):
+        output += '.npy'
+    stack = np.lib.format.open_memmap(output, mode='w+', dtype=first.dtype,
+                                      shape=shape)
+    for c, name in enumerate(names):
+        for f, path in enumerate(paths[name]):
+            im = first if (c, f) == (0, 0) else skimage.io.imread(path)
+            if im.shape != first.shape:
+                raise ValueError(path + ' has shape ' + str(im.shape)
+                                 + ', expected ' + str(first.shape))
+            stack[c, f] = im
+    stack.flush()
+    del stack
+
+    index = {'channels': names,
+             'frames': frames,
+             'times': [frame * interval for frame in frames],
+             'files': paths}
+    with open(output[:-4] + '.json', 'w') as f:
+        json.dump(index, f, indent=1)
+    return ImageStack(output)
+
+
+class ImageStack(object):
+    """
+    A packed time-lapse opened as a read-only memory map.
+
+    Parameters
+    ----------
+    path : str
+        Path to the array file written by `pack_stack`.
+
+    Attributes
+    ----------
+    data : numpy memmap
+        Array of shape (channels, frames, rows, cols).
+    channels : list of str
+        Channel names in the order of the first axis of `data`.
+    frames : 1d-array
+        Frame numbers in the order of the second axis of `data`.
+    times : 1d-array
+        Time of each frame.
+    """
+    def __init__(self, path):
+        if not path.endswith('.npy'):
+            path += '.npy'
+        self.data = np.load(path, mmap_mode='r')
+        with open(path[:-4] + '.json') as f:
+            index = json.load(f)
+        self.channels = index['channels']
+        self.frames = np.array(index['frames'])
+        self.times = np.array(index['times'])
+        self.files = index['files']
+
+    def __len__(self):
+        return len(self.frames)
+
+    def channel(self, name):
+        """
+        Returns a frames x rows x cols view of one channel.
+        """
+        return self.data[self.channels.index(name)]
+
+    def frame(self, name, frame):
+        """
+        Returns a view of the image of one channel at a given frame number.
+        """
+        f = np.searchsorted(self.frames, frame)
+        if f == len(self.frames) or self.frames[f] != frame:
+            raise KeyError('No frame ' + str(frame) + ' in the stack.')
+        return self.data[self.channels.index(name), f]
+
+    def __iter__(self):
+        """
+        Iterates over (time, {channel: image}) for every frame.
+        """
+        for f, t in enumerate(self.times):
+            yield t, {name: self.data[c, f]
+                      for c, name in enumerate(self.channels)}
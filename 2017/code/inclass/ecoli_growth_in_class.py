@@ -121,9 +121,17 @@ print('Bacterial area in this frame is ' + str(bacterial_area) + ' sq pixels')
 image_names = glob.glob('../data/ecoli_growth/ecoli_TRITC_*.tif')
 
 # The asterisk means it will get all file names that match that pattern where
-# anything can occur betweeen `ecoli_phase_ ` and `.tif`. With this set of
-# file names, now we can simply iterate through each file and perform the same
-# set of steps!
+# anything can occur betweeen `ecoli_phase_ ` and `.tif`. Note that glob makes
+# no promise about the order of the names, and even alphabetical order would
+# put frame 10 before frame 2! We sort the names by the frame number at the
+# end of each name so that our time points come out in the right order.
+image_names = sorted(image_names,
+                     key=lambda name: int(name.split('_')[-1].split('.')[0]))
+
+# With this set of file names, now we can simply iterate through each file and
+# perform the same set of steps! For long movies, the course module growth.py
+# has a function batch_areas that does the same thing using several
+# processors at once.
 cell_area = np.zeros(len(image_names))  # Make an empty storage vector.
 for i in range(len(image_names)):
     # Load the image.
@@ -195,6 +203,17 @@ fit_index = np.argmin(sum_sq_residuals)
 fit_rate = slope[fit_index]
 print('The growth rate is ' + str(fit_rate) + 'min^-1.')
 
+# The grid search can only be as precise as the spacing of our slopes. For
+# this model we can also solve for the best slope exactly: setting the
+# derivative of the sum of squared residuals with respect to k to zero gives
+#
+#       k = sum(t * log_area) / sum(t**2).
+#
+# The course module growth.py has a function fit_growth_rate that does this
+# for one or many growth curves at once.
+exact_rate = np.sum(time * log_area) / np.sum(time**2)
+print('The least-squares growth rate is ' + str(exact_rate) + 'min^-1.')
+
 # Now, let's compute the doubling time.
 t_double = np.log(2) / fit_rate
 print('The doubling time is ' + str(t_double) + ' min.')
@@ -84,6 +84,11 @@ def master_eq(prob, k, dt):
                         - 2 * k * dt * prob[x, t-1] + k * dt * prob[x-1, t-1]
     return prob
 
+# The loop over boxes above is the clearest way to see the master equation at
+# work, but it gets slow for lattices with more than a few hundred boxes. The
+# course module `master_equation.py` provides a `master_eq` function with the
+# same arguments that updates all of the boxes at once using array slices.
+
 # With this function in place, let's generate the vectors needed for our
 # infite plane diffusion.
 num_boxes = 100
@@ -0,0 +1,232 @@
+"""
+Opt-in timers and counters for finding where a long analysis spends its
+time in the physical biology of the cell course code.
+
+The integrators in `master_equation`, `stochastic` and `frap`, and the image
+functions in `pboc_utils` and `growth`, record each stage they run (the
+Euler loop, reading an image, the background blur, labeling, ...) under a
+name such as 'phase_segmentation.background'. Nothing is recorded until
+instrumentation is switched on, and while it is off each hook costs a single
+check of a flag.
+
+    import instrument
+    instrument.enable()
+    seg = pboc_utils.phase_segmentation(image, -0.2)
+    print(instrument.format_report())
+
+Setting the environment variable PBOC_INSTRUMENT=1 switches instrumentation
+on when this module is first imported, which is handy for timing a script
+without editing it.
+
+The records live in the process that made them, so stages run in the worker
+processes of `growth.batch_areas` or `smfish.fit_directory` are not included
+in the report of the parent process.
+"""
+import collections
+import contextlib
+import functools
+import inspect
+import os
+import time
+
+import numpy as np
+
+_enabled = os.environ.get('PBOC_INSTRUMENT', '') not in ('', '0')
+
+# stage name -> [number of calls, wall time in seconds, bytes processed]
+_records = collections.defaultdict(lambda: [0, 0.0, 0])
+
+
+def enable():
+    """
+    Starts recording stages and counters.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    Stops recording. Records made so far are kept until `reset`.
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """
+    Returns True if stages are being recorded.
+    """
+    return _enabled
+
+
+def reset():
+    """
+    Discards all records.
+    """
+    _records.clear()
+
+
+@contextlib.contextmanager
+def recording():
+    """
+    Context manager that records everything run inside it, starting from
+    an empty report, and restores the previous on/off state on exit.
+    """
+    was_enabled = _enabled
+    reset()
+    enable()
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def count(stage, calls=1, nbytes=0, seconds=0.0):
+    """
+    Adds to the records of a stage without timing anything, e.g. to count
+    events inside a loop whose total time is recorded elsewhere.
+    """
+    if _enabled:
+        record = _records[stage]
+        record[0] += calls
+        record[1] += seconds
+        record[2] += int(nbytes)
+
+
+class _Timer(object):
+    """
+    Context manager that adds its wall time to the records of a stage.
+    """
+
+    def __init__(self, stage, nbytes):
+        self.stage = stage
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        count(self.stage, 1, self.nbytes, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer(object):
+    """
+    Context manager that does nothing, used while recording is off.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage, nbytes=0):
+    """
+    Context manager that records the wall time of the code inside it.
+
+    Parameters
+    ----------
+    stage : str
+        Name under which the time is recorded.
+    nbytes : int, default 0
+        Number of bytes processed by the stage, e.g. the size of the image
+        being filtered.
+
+    Examples
+    --------
+    >>> with instrument.timer('blur', im.nbytes):
+    ...     im_blur = skimage.filters.gaussian(im, 50)
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(stage, nbytes)
+
+
+def array_bytes(*arrays):
+    """
+    Returns the total size in bytes of the numpy arrays among the arguments,
+    ignoring anything that is not an array.
+    """
+    return sum(a.nbytes for a in arrays if isinstance(a, np.ndarray))
+
+
+def timed(stage=None):
+    """
+    Decorator that records the wall time of every call of a function. The
+    bytes processed are taken to be the size of the array arguments.
+
+    Parameters
+    ----------
+    stage : str, optional
+        Name under which calls are recorded. Defaults to the name of the
+        function.
+
+    Generator functions can't be decorated, since a call only creates the
+    generator and none of the work would be timed. Use `timer` around the
+    work inside the generator instead.
+    """
+    def decorate(func):
+        if inspect.isgeneratorfunction(func):
+            raise TypeError('timed cannot time the generator function {0}; '
+                            'use instrument.timer inside it.'.format(
+                                    func.__name__))
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            nbytes = array_bytes(*args) + array_bytes(*kwargs.values())
+            with _Timer(name, nbytes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_step(step, stage):
+    """
+    Wraps a stepper function with signature step(prob, out), such as those
+    used by `master_equation.stream`, so that every step is recorded. When
+    recording is off the stepper is returned unchanged, so integration loops
+    pay nothing.
+    """
+    if not _enabled:
+        return step
+
+    def wrapper(prob, out):
+        with _Timer(stage, prob.nbytes):
+            return step(prob, out)
+    return wrapper
+
+
+def report():
+    """
+    Returns the records as a dictionary mapping each stage name to a
+    dictionary with the number of 'calls', the total wall time in 'seconds'
+    and the total 'bytes' processed.
+    """
+    return {stage: {'calls': calls, 'seconds': seconds, 'bytes': nbytes}
+            for stage, (calls, seconds, nbytes) in _records.items()}
+
+
+def format_report():
+    """
+    Returns the records as a table sorted by total wall time, slowest stage
+    first.
+    """
+    lines = ['{0:<40s} {1:>9s} {2:>11s} {3:>11s} {4:>10s}'.format(
+            'stage', 'calls', 'total (s)', 'per call', 'MB')]
+    for stage, (calls, seconds, nbytes) in sorted(
+            _records.items(), key=lambda item: -item[1][1]):
+        lines.append('{0:<40s} {1:>9d} {2:>11.4f} {3:>11.3g} {4:>10.1f}'
+                     .format(stage, calls, seconds, seconds / max(calls, 1),
+                             nbytes / 2**20))
+    return '\n'.join(lines)
@@ -52,6 +52,16 @@ for t in range(1, int(num_steps)):
                     + gamma*(m+1)*dt*prob[m+1, t-1] - gamma*m*dt*prob[m, t-1] \
                     - r*dt*prob[m, t-1]
 
+# Writing out the boundaries and the rate terms by hand like this is a good
+# way to understand the master equation, but it is easy to get an index wrong.
+# The course module master_equation.py describes this model (and the
+# diffusion and polymer models) by its birth and death rates alone, e.g.
+#
+#   model = master_equation.mrna_model(r, gamma, upper_bound)
+#
+# and can integrate it with several different methods or jump straight to
+# the steady state with model.steady_state().
+
 # We can now show the distribution of copy numbers at the beginning and end
 # of the integration.
 
@@ -0,0 +1,919 @@
+"""
+Numerical integrators for the one-dimensional master equations used in the
+physical biology of the cell course at Cold Spring Harbor Laboratories.
+
+The in-class scripts integrate these equations with explicit Python loops over
+every box at every time step, which is the clearest way to see the master
+equation at work but becomes slow for large lattices. The functions here
+perform the same updates as whole-array operations.
+
+All of the models treated in the course (diffusion on a lattice, mRNA
+production and decay, polymer growth and shrinkage) are birth-death
+processes, meaning that the state can only change by one unit at a time. The
+master equation for such a process can be written as dP/dt = Q P, where the
+generator Q is a tridiagonal matrix. Building Q as a sparse matrix lets us
+jump directly to the times we care about using the matrix exponential rather
+than taking thousands of small Euler steps.
+"""
+import warnings
+
+import numpy as np
+import scipy.integrate
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+
+import instrument
+import stochastic
+
+
+def diffusion_step(prob, k, dt, out=None):
+    """
+    Performs a single forward Euler step of the one-dimensional diffusion
+    master equation with reflecting boundaries.
+
+    Parameters
+    ----------
+    prob : 1d-array
+        Probability of finding the particle in each box at the current time.
+    k : float
+        Diffusion rate of the particles in units of 1/s.
+    dt : float
+        Time step for the integration.
+    out : 1d-array, optional
+        Array in which to store the updated probabilities. This must not be
+        the same array as `prob`. If None, a new array is allocated.
+
+    Returns
+    -------
+    out : 1d-array
+        Probability of finding the particle in each box after one time step.
+    """
+    if out is None:
+        out = np.empty_like(prob)
+
+    # The interior boxes receive probability from both neighbors. Written with
+    # slices, the update for every box is a single array operation. The
+    # operations are ordered exactly as in the loop version so that the
+    # results are identical to the last bit.
+    out[1:-1] = prob[1:-1] + k * dt * prob[2:] \
+                - 2 * k * dt * prob[1:-1] + k * dt * prob[:-2]
+
+    # Reflecting boundaries at the first and last box.
+    out[0] = prob[0] - k * dt * prob[0] + k * dt * prob[1]
+    out[-1] = prob[-1] - k * dt * prob[-1] + k * dt * prob[-2]
+    return out
+
+
+@instrument.timed()
+def master_eq(prob, k, dt):
+    """
+    Computes the master equation for diffusion in one dimension using a
+    vectorized stencil over the boxes at each time step.
+
+    Parameters
+    ----------
+    prob : 2d-array
+        Array in which the probabilities will be calculated. This should be in
+        the shape of N boxes by M time points. This should have a preset
+        initial condition.
+    k : float
+        Diffusion rate of the particles in units of 1/s
+    dt : float
+        Time step for the integration.
+
+    Returns
+    -------
+    prob : 2d-array
+        The probability vector supplied populated with the calculated
+        probabilities.
+    """
+    num_boxes, time_points = np.shape(prob)
+
+    # The columns of prob are strided in memory, so we do the arithmetic on
+    # two contiguous work vectors and only copy each result into place.
+    current = np.array(prob[:, 0], dtype=float)
+    update = np.empty_like(current)
+    for t in range(1, time_points):
+        diffusion_step(current, k, dt, out=update)
+        prob[:, t] = update
+        current, update = update, current
+    return prob
+
+
+def birth_death_generator(birth_rates, death_rates):
+    """
+    Builds the generator of a one-dimensional birth-death master equation as
+    a sparse tridiagonal matrix.
+
+    Parameters
+    ----------
+    birth_rates : 1d-array
+        Rate of moving from state n to state n+1 for each state n. The last
+        entry is ignored since the state space is truncated there.
+    death_rates : 1d-array
+        Rate of moving from state n to state n-1 for each state n. The first
+        entry is ignored since there is no state below zero.
+
+    Returns
+    -------
+    generator : scipy.sparse.csr_matrix
+        N x N matrix Q such that dP/dt = Q P, where P is the column vector of
+        probabilities of each state. Each column of Q sums to zero so that
+        probability is conserved.
+    """
+    birth_rates = np.array(birth_rates, dtype=float)
+    death_rates = np.array(death_rates, dtype=float)
+    if birth_rates.shape != death_rates.shape or birth_rates.ndim != 1:
+        raise ValueError('birth_rates and death_rates must be 1d-arrays of '
+                         'the same length.')
+
+    # Enforce the boundaries of the truncated state space.
+    birth_rates[-1] = 0
+    death_rates[0] = 0
+
+    # Probability flows into state n from n-1 (birth) and from n+1 (death)
+    # and flows out of state n at the total rate of leaving it.
+    diagonals = [birth_rates[:-1], -(birth_rates + death_rates),
+                 death_rates[1:]]
+    return scipy.sparse.diags(diagonals, [-1, 0, 1], format='csr')
+
+
+def diffusion_generator(num_boxes, k):
+    """
+    Builds the generator for diffusion on a lattice of boxes with reflecting
+    boundaries, matching `master_eq`.
+
+    Parameters
+    ----------
+    num_boxes : int
+        Number of boxes in the lattice.
+    k : float
+        Hopping rate of the particles in units of 1/s.
+
+    Returns
+    -------
+    generator : scipy.sparse.csr_matrix
+        num_boxes x num_boxes generator of the diffusion master equation.
+    """
+    return diffusion_model(num_boxes, k).generator
+
+
+def mrna_generator(r, gamma, upper_bound):
+    """
+    Builds the generator for constitutive mRNA production and decay,
+    matching the integration in mRNA_spreading_butter.py.
+
+    Parameters
+    ----------
+    r : float
+        mRNA production rate.
+    gamma : float
+        mRNA decay rate per molecule.
+    upper_bound : int
+        Maximum copy number to simulate.
+
+    Returns
+    -------
+    generator : scipy.sparse.csr_matrix
+        (upper_bound + 1) x (upper_bound + 1) generator.
+    """
+    return mrna_model(r, gamma, upper_bound).generator
+
+
+def polymer_generator(r, gamma, tot_length, length_dependent=False):
+    """
+    Builds the generator for a polymer that grows and shrinks one monomer at
+    a time, matching the models in microtubule_butter_spreading.ipynb.
+
+    Parameters
+    ----------
+    r : float
+        Monomer addition rate.
+    gamma : float
+        Monomer removal rate.
+    tot_length : int
+        Maximum polymer length.
+    length_dependent : bool, default False
+        If True, the removal rate is proportional to the polymer length
+        (gamma * ell), giving a Poisson steady state. Otherwise the removal
+        rate is constant, giving a geometric steady state.
+
+    Returns
+    -------
+    generator : scipy.sparse.csr_matrix
+        (tot_length + 1) x (tot_length + 1) generator.
+    """
+    return polymer_model(r, gamma, tot_length, length_dependent).generator
+
+
+@instrument.timed()
+def propagate(generator, p0, times):
+    """
+    Propagates the probability distribution to a list of output times using
+    the action of the matrix exponential, P(t) = exp(Q t) P(0).
+
+    Parameters
+    ----------
+    generator : scipy.sparse matrix
+        N x N generator of the master equation, e.g. from
+        `birth_death_generator`.
+    p0 : 1d-array
+        Probability distribution at time zero.
+    times : 1d-array
+        Non-decreasing times at which to report the distribution.
+
+    Returns
+    -------
+    prob : 2d-array
+        N x len(times) array whose columns are the distributions at each of
+        the requested times. Only these snapshots are stored.
+    """
+    times = np.atleast_1d(np.asarray(times, dtype=float))
+    if np.any(times < 0) or np.any(np.diff(times) < 0):
+        raise ValueError('times must be non-negative and non-decreasing.')
+    generator = scipy.sparse.csr_matrix(generator)
+
+    prob = np.empty((len(p0), len(times)))
+    current = np.array(p0, dtype=float)
+    t_current = 0.0
+    # Each snapshot is propagated from the previous one, so the cost depends
+    # only on the number of outputs and not on any integration time step.
+    for i, t in enumerate(times):
+        if t > t_current:
+            current = scipy.sparse.linalg.expm_multiply(
+                                (t - t_current) * generator, current)
+            t_current = t
+        prob[:, i] = current
+    return prob
+
+
+def _rates(generator):
+    """
+    Recovers the birth and death rates of each state from a tridiagonal
+    generator built by `birth_death_generator`.
+    """
+    generator = scipy.sparse.dia_matrix(generator)
+    birth_rates = np.append(generator.diagonal(-1), 0)
+    death_rates = np.insert(generator.diagonal(1), 0, 0)
+    return birth_rates, death_rates
+
+
+@instrument.timed()
+def steady_state(generator):
+    """
+    Computes the stationary distribution of a birth-death master equation
+    directly, without integrating through the transient.
+
+    In steady state the probability flux between neighboring states balances
+    (detailed balance), P(n+1) d(n+1) = P(n) b(n), so the distribution
+    follows from a cumulative product of the ratio of birth to death rates.
+    This takes O(N) operations.
+
+    Parameters
+    ----------
+    generator : scipy.sparse matrix
+        Tridiagonal generator, e.g. from `birth_death_generator`.
+
+    Returns
+    -------
+    prob : 1d-array
+        Normalized stationary distribution.
+    """
+    birth_rates, death_rates = _rates(generator)
+    birth_rates = birth_rates[:-1]
+    death_rates = death_rates[1:]
+    if np.any((death_rates == 0) & (birth_rates > 0)):
+        raise ValueError('Every state that can be entered by a birth must be '
+                         'able to leave by a death for a steady state to '
+                         'exist.')
+    # Working with logs avoids overflow of the cumulative product for large
+    # state spaces.
+    with np.errstate(divide='ignore'):
+        log_ratio = np.log(birth_rates) - np.log(death_rates)
+    log_ratio[birth_rates == 0] = -np.inf
+    log_prob = np.concatenate(([0.0], np.cumsum(log_ratio)))
+    prob = np.exp(log_prob - np.max(log_prob))
+    return prob / np.sum(prob)
+
+
+def relaxation_time(generator):
+    """
+    Computes the time scale on which a birth-death master equation relaxes
+    to its steady state, from the gap between the zero eigenvalue of the
+    generator and the next one.
+
+    Parameters
+    ----------
+    generator : scipy.sparse matrix
+        Tridiagonal generator, e.g. from `birth_death_generator`.
+
+    Returns
+    -------
+    tau : float
+        Relaxation time 1 / gap, in the time units of the rates.
+    """
+    birth_rates, death_rates = _rates(generator)
+    # Detailed balance makes the generator similar to a symmetric
+    # tridiagonal matrix, whose eigenvalues we can find efficiently.
+    diagonal = -(birth_rates + death_rates)
+    off_diagonal = np.sqrt(birth_rates[:-1] * death_rates[1:])
+    eigenvalues = scipy.linalg.eigvalsh_tridiagonal(
+                        diagonal, off_diagonal, select='i',
+                        select_range=(len(diagonal) - 2, len(diagonal) - 1))
+    return 1 / -eigenvalues[0]
+
+
+def euler_stepper(generator, dt):
+    """
+    Makes a function that performs one forward Euler step of the master
+    equation dP/dt = Q P for use with `stream`.
+
+    Parameters
+    ----------
+    generator : scipy.sparse matrix
+        N x N generator of the master equation.
+    dt : float
+        Time step for the integration.
+
+    Returns
+    -------
+    step : function
+        Function with signature step(prob, out) that writes the probabilities
+        one time step after `prob` into `out` and returns `out`.
+    """
+    generator = scipy.sparse.csr_matrix(generator)
+
+    # The explicit step only keeps probabilities positive if no state loses
+    # more than all of its probability in a single step.
+    max_exit_rate = np.max(-generator.diagonal())
+    if max_exit_rate * dt > 1:
+        warnings.warn('dt * max exit rate = {0:.3g} > 1; the Euler step will '
+                      'produce negative probabilities. Reduce dt or use '
+                      'implicit_stepper.'.format(max_exit_rate * dt))
+
+    def step(prob, out):
+        return np.add(prob, dt * generator.dot(prob), out=out)
+    return step
+
+
+def implicit_stepper(generator, dt, method='backward_euler'):
+    """
+    Makes a function that performs one implicit step of the master equation
+    dP/dt = Q P for use with `stream`. Unlike the forward Euler step, the
+    backward Euler step remains stable and keeps probabilities positive for
+    any dt, which matters when the exit rates grow with the size of the
+    state space. Crank-Nicolson is stable for any dt but only keeps
+    probabilities positive while dt * max exit rate <= 2; beyond that it
+    warns, as `euler_stepper` does.
+
+    Parameters
+    ----------
+    generator : scipy.sparse matrix
+        N x N generator of the master equation.
+    dt : float
+        Time step for the integration.
+    method : str, default 'backward_euler'
+        Either 'backward_euler', which solves (I - dt Q) P(t+dt) = P(t) and
+        never produces negative probabilities, or 'crank_nicolson', which
+        solves (I - dt Q/2) P(t+dt) = (I + dt Q/2) P(t) and is second order
+        accurate in dt but can produce negative probabilities for large dt.
+
+    Returns
+    -------
+    step : function
+        Function with signature step(prob, out) that writes the probabilities
+        one time step after `prob` into `out` and returns `out`.
+    """
+    if method == 'backward_euler':
+        theta = 1.0
+    elif method == 'crank_nicolson':
+        theta = 0.5
+    else:
+        raise ValueError("method must be 'backward_euler' or "
+                         "'crank_nicolson'.")
+    generator = scipy.sparse.csc_matrix(generator)
+    identity = scipy.sparse.identity(generator.shape[0], format='csc')
+
+    # (I - theta dt Q) always has a nonnegative inverse, so the step keeps
+    # probabilities positive as long as the diagonal of the explicit part
+    # I + (1 - theta) dt Q is nonnegative.
+    max_exit_rate = np.max(-generator.diagonal())
+    if theta < 1 and (1 - theta) * dt * max_exit_rate > 1:
+        warnings.warn('dt * max exit rate = {0:.3g} > {1:.3g}; the {2} step '
+                      'will produce negative probabilities. Reduce dt or '
+                      "use method='backward_euler'.".format(
+                          dt * max_exit_rate, 1 / (1 - theta), method))
+
+    # The matrix to invert is the same at every step, so we factor it once
+    # and reuse the factorization for each solve.
+    lu = scipy.sparse.linalg.splu(identity - theta * dt * generator)
+    explicit_part = identity + (1 - theta) * dt * generator
+
+    def step(prob, out):
+        out[:] = lu.solve(explicit_part.dot(prob))
+        return out
+    return step
+
+
+@instrument.timed()
+def solve_adaptive(generator, p0, times, method='RK45', rtol=1e-6,
+                   atol=1e-10):
+    """
+    Integrates the master equation dP/dt = Q P with an adaptive time step
+    chosen by error control, reporting the distribution at the given times.
+
+    Parameters
+    ----------
+    generator : scipy.sparse matrix
+        N x N generator of the master equation.
+    p0 : 1d-array
+        Probability distribution at time zero.
+    times : 1d-array
+        Non-decreasing times at which to report the distribution.
+    method : str, default 'RK45'
+        Integration method passed to `scipy.integrate.solve_ivp`. The
+        Runge-Kutta methods ('RK45', 'RK23', 'DOP853') are explicit; for very
+        stiff problems the implicit 'BDF' or 'Radau' methods make use of the
+        sparse generator as the Jacobian.
+    rtol, atol : float
+        Relative and absolute error tolerances for each step.
+
+    Returns
+    -------
+    prob : 2d-array
+        N x len(times) array whose columns are the distributions at each of
+        the requested times.
+    """
+    times = np.atleast_1d(np.asarray(times, dtype=float))
+    if np.any(times < 0) or np.any(np.diff(times) < 0):
+        raise ValueError('times must be non-negative and non-decreasing.')
+    generator = scipy.sparse.csr_matrix(generator)
+    p0 = np.array(p0, dtype=float)
+    if times[-1] == 0:
+        # Nothing to integrate; solve_ivp rejects an empty time span.
+        return np.tile(p0[:, np.newaxis], (1, len(times)))
+
+    def rhs(t, prob):
+        return generator.dot(prob)
+
+    # Only the implicit methods make use of the Jacobian.
+    options = {}
+    if method in ('BDF', 'Radau', 'LSODA'):
+        options['jac'] = generator
+    sol = scipy.integrate.solve_ivp(rhs, (0, times[-1]), p0,
+                                    method=method, t_eval=times, rtol=rtol,
+                                    atol=atol, **options)
+    if not sol.success:
+        raise RuntimeError('Integration failed: ' + sol.message)
+
+    # Probabilities that come out negative beyond the requested tolerance
+    # indicate the error control has failed, so we don't hide them.
+    if np.min(sol.y) < -atol * 10:
+        warnings.warn('Integration produced negative probabilities as low '
+                      'as {0:.3g}; tighten rtol/atol or use an implicit '
+                      'method.'.format(np.min(sol.y)))
+    return sol.y
+
+
+def diffusion_stepper(k, dt):
+    """
+    Makes a function that performs one step of the diffusion master equation
+    exactly as `master_eq` does, for use with `stream`.
+
+    Parameters
+    ----------
+    k : float
+        Diffusion rate of the particles in units of 1/s.
+    dt : float
+        Time step for the integration.
+
+    Returns
+    -------
+    step : function
+        Function with signature step(prob, out) that writes the probabilities
+        one time step after `prob` into `out` and returns `out`.
+    """
+    def step(prob, out):
+        return diffusion_step(prob, k, dt, out=out)
+    return step
+
+
+def stream(step, p0, dt, time_points, stride=1):
+    """
+    Integrates a master equation and yields snapshots of the distribution
+    instead of storing every time point.
+
+    Parameters
+    ----------
+    step : function
+        Function with signature step(prob, out) performing one time step,
+        such as those returned by `euler_stepper` or `diffusion_stepper`.
+    p0 : 1d-array
+        Probability distribution at time zero.
+    dt : float
+        Time step for the integration.
+    time_points : int
+        Total number of time points, including the initial condition. This
+        matches the number of columns of the arrays used by `master_eq`.
+    stride : int, default 1
+        Yield a snapshot every `stride` time points.
+
+    Yields
+    ------
+    t : float
+        Time of the snapshot.
+    prob : 1d-array
+        Copy of the distribution at time t.
+
+    Notes
+    -----
+    Only two state vectors are held in memory during the integration, so
+    runs of millions of steps cost no more memory than a single step.
+    """
+    if stride < 1:
+        raise ValueError('stride must be a positive integer.')
+    current = np.array(p0, dtype=float)
+    update = np.empty_like(current)
+    step = instrument.timed_step(step, 'stream.step')
+    for i in range(time_points):
+        if i > 0:
+            step(current, update)
+            current, update = update, current
+        if i % stride == 0:
+            yield i * dt, current.copy()
+
+
+def drain(snapshots, sink):
+    """
+    Passes every snapshot of a stream to a sink, such as a function that
+    appends to a file.
+
+    Parameters
+    ----------
+    snapshots : iterable of (t, prob)
+        Stream of snapshots, e.g. from `stream`.
+    sink : function
+        Function with signature sink(t, prob) called once per snapshot.
+
+    Returns
+    -------
+    num_snapshots : int
+        Number of snapshots passed to the sink.
+    """
+    num_snapshots = 0
+    for t, prob in snapshots:
+        sink(t, prob)
+        num_snapshots += 1
+    return num_snapshots
+
+
+def collect(snapshots):
+    """
+    Gathers a stream of snapshots into the N boxes by M time points layout
+    used throughout the course scripts.
+
+    Parameters
+    ----------
+    snapshots : iterable of (t, prob)
+        Stream of snapshots, e.g. from `stream`.
+
+    Returns
+    -------
+    time_vec : 1d-array
+        Times of the snapshots.
+    prob : 2d-array
+        N x M array whose columns are the snapshots.
+    """
+    times, columns = [], []
+    for t, prob in snapshots:
+        times.append(t)
+        columns.append(prob)
+    return np.array(times), np.column_stack(columns)
+
+
+def batch_stepper(birth_rates, death_rates, dt):
+    """
+    Makes a function that performs one forward Euler step for many
+    independent birth-death master equations at once, for use with `stream`.
+
+    Parameters
+    ----------
+    birth_rates : 2d-array
+        P x N array of the rate of moving from state n to n+1 for each of P
+        parameter sets. The last column is ignored.
+    death_rates : 2d-array
+        P x N array of the rate of moving from state n to n-1 for each of P
+        parameter sets. The first column is ignored.
+    dt : float
+        Time step for the integration.
+
+    Returns
+    -------
+    step : function
+        Function with signature step(prob, out) that advances the P x N array
+        of distributions `prob` by one time step, writing into `out`.
+    """
+    birth_rates = np.array(birth_rates, dtype=float)
+    death_rates = np.array(death_rates, dtype=float)
+    birth_rates[:, -1] = 0
+    death_rates[:, 0] = 0
+
+    # Precompute the rates multiplied by dt so each step is three array
+    # operations regardless of how many parameter sets there are.
+    birth_dt = birth_rates[:, :-1] * dt
+    death_dt = death_rates[:, 1:] * dt
+    stay = 1 - (birth_rates + death_rates) * dt
+
+    def step(prob, out):
+        np.multiply(stay, prob, out=out)
+        out[:, 1:] += birth_dt * prob[:, :-1]
+        out[:, :-1] += death_dt * prob[:, 1:]
+        return out
+    return step
+
+
+class SweepResult(object):
+    """
+    Distributions computed over a grid of model parameters.
+
+    Attributes
+    ----------
+    r : nd-array
+        Production rate of each parameter set.
+    gamma : nd-array
+        Decay rate of each parameter set, with the same shape as `r`.
+    copy_number : 1d-array
+        mRNA copy numbers covered by the distributions.
+    time : 1d-array
+        Times of the stored snapshots.
+    prob : nd-array
+        Probabilities with shape r.shape + (len(copy_number), len(time)).
+    """
+    def __init__(self, r, gamma, copy_number, time, prob):
+        self.r = r
+        self.gamma = gamma
+        self.copy_number = copy_number
+        self.time = time
+        self.prob = prob
+
+    def select(self, r, gamma):
+        """
+        Returns the copy number x time array for the parameter set closest
+        to the given rates, in the layout expected by `pboc_utils.bar3`.
+        """
+        dist = (self.r - r)**2 + (self.gamma - gamma)**2
+        index = np.unravel_index(np.argmin(dist), dist.shape)
+        return self.prob[index]
+
+    def mean(self):
+        """
+        Returns the mean copy number for every parameter set and time.
+        """
+        return np.einsum('...nt,n->...t', self.prob, self.copy_number)
+
+
+@instrument.timed()
+def mrna_sweep(r, gamma, upper_bound, dt, time_points, stride=1):
+    """
+    Integrates the mRNA production and decay master equation for many
+    (r, gamma) pairs at once using a single vectorized Euler update per time
+    step.
+
+    Parameters
+    ----------
+    r : float or nd-array
+        mRNA production rates.
+    gamma : float or nd-array
+        mRNA decay rates. `r` and `gamma` are broadcast against each other,
+        so passing r[:, np.newaxis] and gamma[np.newaxis, :] sweeps the full
+        grid of combinations.
+    upper_bound : int
+        Maximum copy number to simulate.
+    dt : float
+        Time step for the integration.
+    time_points : int
+        Total number of time points, including the initial condition.
+    stride : int, default 1
+        Store a snapshot every `stride` time points.
+
+    Returns
+    -------
+    result : SweepResult
+        Distributions for every parameter set, starting from zero mRNA.
+    """
+    r, gamma = np.broadcast_arrays(np.asarray(r, dtype=float),
+                                   np.asarray(gamma, dtype=float))
+    copy_number = np.arange(upper_bound + 1)
+
+    # Flatten the parameter grid so each row is one parameter set.
+    r_flat = r.ravel()[:, np.newaxis]
+    gamma_flat = gamma.ravel()[:, np.newaxis]
+    birth_rates = r_flat * np.ones(upper_bound + 1)
+    death_rates = gamma_flat * copy_number
+    if np.max(birth_rates + death_rates) * dt > 1:
+        warnings.warn('dt is too large for the fastest parameter set; the '
+                      'Euler step will produce negative probabilities.')
+
+    p0 = np.zeros((r_flat.shape[0], upper_bound + 1))
+    p0[:, 0] = 1
+    step = batch_stepper(birth_rates, death_rates, dt)
+    time_vec, snapshots = [], []
+    for t, prob in stream(step, p0, dt, time_points, stride=stride):
+        time_vec.append(t)
+        snapshots.append(prob)
+    prob = np.stack(snapshots, axis=-1)
+    prob = prob.reshape(r.shape + (upper_bound + 1, len(time_vec)))
+    return SweepResult(r, gamma, copy_number, np.array(time_vec), prob)
+
+
+class BirthDeathModel(object):
+    """
+    A one-dimensional birth-death process defined by its rates, which can be
+    integrated with any of the methods in this module.
+
+    The birth and death rates are evaluated once for every state when the
+    model is created and cached as arrays, along with the sparse generator,
+    so repeated integrations don't recompute them.
+
+    Parameters
+    ----------
+    birth : function or float
+        Rate of moving from state n to n+1, as a function of an array of
+        states n, or a constant.
+    death : function or float
+        Rate of moving from state n to n-1, as a function of an array of
+        states n, or a constant.
+    num_states : int
+        Number of states 0, 1, ..., num_states - 1. Births out of the last
+        state and deaths out of state 0 are not allowed.
+
+    Attributes
+    ----------
+    states : 1d-array
+        The states 0 through num_states - 1.
+    birth_rates, death_rates : 1d-array
+        Cached rate of leaving each state by a birth or a death.
+    generator : scipy.sparse.csr_matrix
+        Cached generator of the master equation.
+    """
+    def __init__(self, birth, death, num_states):
+        self.states = np.arange(num_states)
+        self.birth_rates = self._evaluate(birth)
+        self.death_rates = self._evaluate(death)
+        self.birth_rates[-1] = 0
+        self.death_rates[0] = 0
+        self.generator = birth_death_generator(self.birth_rates,
+                                               self.death_rates)
+        self._steppers = {}
+
+    def _evaluate(self, rate):
+        if callable(rate):
+            values = rate(self.states)
+        else:
+            values = rate
+        return np.array(np.broadcast_to(values, self.states.shape),
+                        dtype=float)
+
+    def stepper(self, dt, method='euler'):
+        """
+        Returns a function step(prob, out) advancing the distribution by dt,
+        for use with `stream`. Steppers are cached, so the implicit methods
+        factor their matrix only once per dt.
+
+        Parameters
+        ----------
+        dt : float
+            Time step.
+        method : str, default 'euler'
+            One of 'euler', 'backward_euler' or 'crank_nicolson'.
+        """
+        key = (method, dt)
+        if key not in self._steppers:
+            if method == 'euler':
+                self._steppers[key] = euler_stepper(self.generator, dt)
+            elif method in ('backward_euler', 'crank_nicolson'):
+                self._steppers[key] = implicit_stepper(self.generator, dt,
+                                                       method=method)
+            else:
+                raise ValueError("method must be 'euler', 'backward_euler' "
+                                 "or 'crank_nicolson'.")
+        return self._steppers[key]
+
+    def initial(self, state=0):
+        """
+        Returns the distribution with all probability in one state.
+        """
+        p0 = np.zeros(len(self.states))
+        p0[state] = 1
+        return p0
+
+    def stream(self, p0, dt, time_points, stride=1, method='euler'):
+        """
+        Yields (t, prob) snapshots of a fixed-step integration, see
+        `stream` and `stepper`.
+        """
+        return stream(self.stepper(dt, method), p0, dt, time_points,
+                      stride=stride)
+
+    def solve(self, p0, times, method='expm', dt=None, num_cells=10000,
+              seed=None):
+        """
+        Computes the distribution at the given times.
+
+        Parameters
+        ----------
+        p0 : 1d-array
+            Probability distribution at time zero.
+        times : 1d-array
+            Non-decreasing times at which to report the distribution.
+        method : str, default 'expm'
+            'expm' uses the matrix exponential (`propagate`), 'adaptive'
+            uses error-controlled Runge-Kutta steps (`solve_adaptive`),
+            'euler', 'backward_euler' and 'crank_nicolson' take fixed steps
+            of length dt and report the step nearest each time, and 'ssa'
+            estimates the distribution from `num_cells` stochastic
+            simulations.
+        dt : float, optional
+            Time step for the fixed-step methods.
+        num_cells : int, default 10000
+            Number of cells for the 'ssa' method.
+        seed : int, optional
+            Seed for the random number generator of the 'ssa' method.
+
+        Returns
+        -------
+        prob : 2d-array
+            num_states x len(times) array of the distribution at each time.
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        if method == 'expm':
+            return propagate(self.generator, p0, times)
+        if method == 'adaptive':
+            return solve_adaptive(self.generator, p0, times)
+        if method == 'ssa':
+            return self._solve_ssa(p0, times, num_cells, seed)
+        if dt is None:
+            raise ValueError('dt is required for fixed-step methods.')
+        steps = np.round(times / dt).astype(int)
+        prob = np.empty((len(self.states), len(times)))
+        snapshots = self.stream(p0, dt, steps.max() + 1, method=method)
+        for i, (t, snapshot) in enumerate(snapshots):
+            prob[:, steps == i] = snapshot[:, np.newaxis]
+        return prob
+
+    def _solve_ssa(self, p0, times, num_cells, seed):
+        rng = np.random.RandomState(seed)
+        x0 = rng.choice(len(self.states), size=num_cells,
+                        p=np.asarray(p0) / np.sum(p0))
+        stoich = np.array([[1], [-1]])
+        birth_rates = self.birth_rates
+        death_rates = self.death_rates
+
+        # The cached rate arrays give the propensities by indexing.
+        def propensity(x):
+            n = x[:, 0]
+            return np.column_stack((birth_rates[n], death_rates[n]))
+
+        stats = stochastic.gillespie(stoich, propensity, x0[:, np.newaxis],
+                                     times, num_cells=num_cells,
+                                     seed=rng.randint(2**31),
+                                     max_count=len(self.states) - 1)
+        return stats['prob'][0]
+
+    def steady_state(self):
+        """
+        Returns the stationary distribution, see `steady_state`.
+        """
+        return steady_state(self.generator)
+
+    def relaxation_time(self):
+        """
+        Returns the relaxation time to steady state, see `relaxation_time`.
+        """
+        return relaxation_time(self.generator)
+
+
+def diffusion_model(num_boxes, k):
+    """
+    Diffusion on a lattice of boxes with reflecting boundaries.
+    """
+    return BirthDeathModel(k, k, num_boxes)
+
+
+def mrna_model(r, gamma, upper_bound):
+    """
+    Constitutive mRNA production at rate r and decay at rate gamma per
+    molecule, as in mRNA_spreading_butter.py.
+    """
+    return BirthDeathModel(r, lambda m: gamma * m, upper_bound + 1)
+
+
+def polymer_model(r, gamma, tot_length, length_dependent=False):
+    """
+    Polymer growth at rate r and shrinkage at rate gamma, or gamma * ell if
+    `length_dependent`, as in microtubule_butter_spreading.ipynb.
+    """
+    if length_dependent:
+        return BirthDeathModel(r, lambda ell: gamma * ell, tot_length + 1)
+    return BirthDeathModel(r, gamma, tot_length + 1)
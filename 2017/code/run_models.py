@@ -0,0 +1,344 @@
+"""
+Runs the course models without a display and writes their figures and
+numerical results to an output directory.
+
+Each model runs in its own worker process with the non-interactive Agg
+backend. A hash of each model's parameters, the course code it imports and
+its input files is stored next to its output, and a model is only rerun when
+that hash changes.
+
+Usage
+-----
+    python run_models.py --output-dir results
+    python run_models.py --output-dir results --models mrna polymer --force
+    python run_models.py --output-dir results --profile
+
+With --profile, the time spent in each stage of the course code (see
+instrument.py) is written to profile.json in each model's directory.
+"""
+import argparse
+import ast
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+# Course modules live next to this script.
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+if CODE_DIR not in sys.path:
+    sys.path.insert(0, CODE_DIR)
+
+import instrument
+
+
+def _init_worker():
+    """
+    Selects the Agg backend in a worker process before any model code, such
+    as pboc_utils.bar3, imports pyplot.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _pyplot():
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _save(fig, output_dir, name):
+    path = os.path.join(output_dir, name)
+    fig.savefig(path)
+    _pyplot().close(fig)
+    return path
+
+
+def run_diffusion(params, output_dir):
+    """
+    Diffusion from the middle of a lattice and from the corner of a small
+    box, as in inclass/master_equation_diffusion.py.
+    """
+    import master_equation
+    import pboc_utils
+    k = params['D'] / params['dx']**2
+    dt = 1 / (10 * k)
+    outputs = []
+    for name, num_boxes, start in [('inf', params['num_boxes'],
+                                    params['num_boxes'] // 2),
+                                   ('box', params['box_boxes'], 0)]:
+        model = master_equation.diffusion_model(num_boxes, k)
+        time_vec, prob = master_equation.collect(
+                model.stream(model.initial(start), dt,
+                             params['time_points']))
+        path = os.path.join(output_dir, 'diffusion_' + name + '.npz')
+        np.savez(path, time=time_vec, prob=prob)
+        fig, _ = pboc_utils.bar3(prob, xlabel='time (sec)',
+                                 ylabel='box number', zlabel='probability',
+                                 bin_step=3, y_vec=time_vec)
+        outputs += [path, _save(fig, output_dir,
+                                'diffusion_' + name + '.png')]
+    return outputs
+
+
+def run_frap(params, output_dir):
+    """
+    One-dimensional FRAP as in inclass/master_equation_diffusion.py.
+    """
+    import frap
+    plt = _pyplot()
+    k = params['D'] / params['dx']**2
+    dt = 1 / (10 * k)
+    mask = np.ones(params['num_boxes'], dtype=bool)
+    bleach = np.zeros_like(mask)
+    bleach[params['bleach_start']:params['bleach_stop']] = True
+    time_vec, recovery = frap.frap(mask, bleach, k, dt, params['time_points'])
+    path = os.path.join(output_dir, 'frap.npz')
+    np.savez(path, time=time_vec, recovery=recovery)
+    fig, ax = plt.subplots()
+    ax.plot(time_vec, recovery)
+    ax.set_xlabel('time (sec)')
+    ax.set_ylabel('relative fluorescence in bleached region')
+    return [path, _save(fig, output_dir, 'frap.png')]
+
+
+def run_mrna(params, output_dir):
+    """
+    mRNA copy number distribution over time, as in mRNA_spreading_butter.py.
+    """
+    import master_equation
+    import pboc_utils
+    model = master_equation.mrna_model(params['r'], params['gamma'],
+                                       params['upper_bound'])
+    num_steps = int(params['time'] / params['dt'])
+    time_vec, prob = master_equation.collect(
+            model.stream(model.initial(), params['dt'], num_steps))
+    path = os.path.join(output_dir, 'mrna.npz')
+    np.savez(path, time=time_vec, prob=prob,
+             steady_state=model.steady_state())
+    fig, _ = pboc_utils.bar3(prob, xlabel='time', ylabel='number of mRNA',
+                             zlabel='probability', y_vec=time_vec,
+                             bin_step=5)
+    return [path, _save(fig, output_dir, 'mrna.png')]
+
+
+def run_polymer(params, output_dir):
+    """
+    Polymer length distributions, as in microtubule_butter_spreading.ipynb.
+    """
+    import master_equation
+    import pboc_utils
+    outputs = []
+    for name, length_dependent in [('constant', False),
+                                   ('length_dependent', True)]:
+        model = master_equation.polymer_model(
+                params[name]['r'], params[name]['gamma'],
+                params['tot_length'], length_dependent=length_dependent)
+        time_vec, prob = master_equation.collect(
+                model.stream(model.initial(params[name]['start']),
+                             params['dt'], params['tot_time']))
+        path = os.path.join(output_dir, 'polymer_' + name + '.npz')
+        np.savez(path, time=time_vec, prob=prob,
+                 steady_state=model.steady_state())
+        fig, _ = pboc_utils.bar3(prob, xlabel='time (steps)',
+                                 ylabel='polymer length in monomers',
+                                 zlabel='P(l, t)',
+                                 bin_step=params['tot_time'] // 30)
+        outputs += [path, _save(fig, output_dir, 'polymer_' + name + '.png')]
+    return outputs
+
+
+def run_growth(params, output_dir):
+    """
+    Colony area and growth rate, as in inclass/ecoli_growth_in_class.py.
+    """
+    import growth
+    plt = _pyplot()
+    df = growth.batch_areas(params['pattern'], thresh=params['thresh'],
+                            interval=params['interval'],
+                            processes=params['processes'])
+    # measure both time and area from the first frame, so the fit through
+    # the origin holds whatever number the first frame has
+    time = df['time'] - df['time'][0]
+    log_area = np.log(df['area']) - np.log(df['area'][0])
+    rate = growth.fit_growth_rate(time, log_area)
+    path = os.path.join(output_dir, 'growth.csv')
+    df.to_csv(path, index=False)
+    with open(os.path.join(output_dir, 'growth.json'), 'w') as f:
+        json.dump({'growth_rate': rate,
+                   'doubling_time': growth.doubling_time(rate)}, f)
+    fig, ax = plt.subplots()
+    ax.plot(time, log_area, 'o', label='experiment')
+    ax.plot(time, rate * time, 'k-', label='fit')
+    ax.set_xlabel('time since first frame (min)')
+    ax.set_ylabel('log(cell area / initial area)')
+    ax.legend()
+    return [path, os.path.join(output_dir, 'growth.json'),
+            _save(fig, output_dir, 'growth.png')]
+
+
+# Function, default parameters, course modules used directly, and glob
+# patterns of input files for each model. The modules these import from the
+# course code are found by `code_closure`.
+MODELS = {
+    'diffusion': (run_diffusion,
+                  {'D': 10, 'dx': 0.01, 'num_boxes': 100, 'box_boxes': 15,
+                   'time_points': 200},
+                  ['master_equation.py', 'pboc_utils.py'], []),
+    'frap': (run_frap,
+             {'D': 10, 'dx': 0.01, 'num_boxes': 15, 'bleach_start': 4,
+              'bleach_stop': 11, 'time_points': 200},
+             ['frap.py'], []),
+    'mrna': (run_mrna,
+             {'r': 2, 'gamma': 1 / 3, 'time': 20, 'dt': 0.05,
+              'upper_bound': 20},
+             ['master_equation.py', 'pboc_utils.py'], []),
+    'polymer': (run_polymer,
+                {'dt': 0.01, 'tot_length': 30, 'tot_time': 2000,
+                 'constant': {'r': 5, 'gamma': 6, 'start': 0},
+                 'length_dependent': {'r': 0.7, 'gamma': 0.3, 'start': 20}},
+                ['master_equation.py', 'pboc_utils.py'], []),
+    'growth': (run_growth,
+               {'pattern': os.path.join(CODE_DIR, 'data', 'ecoli_growth',
+                                        'ecoli_TRITC_*.tif'),
+                'thresh': 0.4, 'interval': 5, 'processes': 1},
+               ['growth.py'], ['pattern']),
+}
+
+
+def code_closure(modules):
+    """
+    Returns the given course modules together with every course module they
+    import, directly or indirectly, in sorted order. Imports of modules that
+    are not files in the course code directory are ignored.
+    """
+    found = set()
+    pending = list(modules)
+    while pending:
+        module = pending.pop()
+        if module in found:
+            continue
+        found.add(module)
+        with open(os.path.join(CODE_DIR, module)) as f:
+            tree = ast.parse(f.read(), filename=module)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                path = name.split('.')[0] + '.py'
+                if os.path.exists(os.path.join(CODE_DIR, path)):
+                    pending.append(path)
+    return sorted(found)
+
+
+def content_hash(name):
+    """
+    Hash of a model's name, parameters, source code and input files.
+    """
+    func, params, modules, inputs = MODELS[name]
+    digest = hashlib.sha256()
+    digest.update(name.encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    # This script imports every model's modules, so its own imports are not
+    # followed.
+    for module in [os.path.basename(__file__)] + code_closure(modules):
+        with open(os.path.join(CODE_DIR, module), 'rb') as f:
+            digest.update(f.read())
+    for key in inputs:
+        for path in sorted(glob.glob(params[key])):
+            digest.update(os.path.basename(path).encode())
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def run_model(name, output_dir, force=False, profile=False):
+    """
+    Runs one model unless its outputs are up to date. If profile is True,
+    the stages it runs are recorded and written to profile.json.
+
+    Returns
+    -------
+    status : str
+        'skipped' if the stored hash matched, 'missing inputs' if the model
+        has no input files to work on, otherwise 'ran'.
+    outputs : list of str
+        Paths of the files written.
+    """
+    func, params, modules, inputs = MODELS[name]
+    model_dir = os.path.join(output_dir, name)
+    hash_path = os.path.join(model_dir, 'inputs.sha256')
+    profile_path = os.path.join(model_dir, 'profile.json')
+    digest = content_hash(name)
+    # A profile can only be recorded by running the model, so a requested
+    # profile that is missing means a rerun even if the outputs are current.
+    if not force and os.path.exists(hash_path) and \
+            (os.path.exists(profile_path) or not profile):
+        with open(hash_path) as f:
+            if f.read().strip() == digest:
+                return 'skipped', []
+    for key in inputs:
+        if not glob.glob(params[key]):
+            return 'missing inputs', []
+    os.makedirs(model_dir, exist_ok=True)
+    if os.path.exists(profile_path):
+        # Don't leave a profile of an older version of the model behind.
+        os.remove(profile_path)
+    if profile:
+        with instrument.recording():
+            outputs = func(params, model_dir)
+        with open(profile_path, 'w') as f:
+            json.dump(instrument.report(), f, indent=1, sort_keys=True)
+        outputs = outputs + [profile_path]
+    else:
+        outputs = func(params, model_dir)
+    # Only record the hash once everything was written successfully.
+    with open(hash_path, 'w') as f:
+        f.write(digest + '\n')
+    return 'ran', outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output-dir', default='results',
+                        help='directory in which to write results')
+    parser.add_argument('--models', nargs='+', default=sorted(MODELS),
+                        choices=sorted(MODELS), help='models to run')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--force', action='store_true',
+                        help='rerun models even if their inputs are '
+                             'unchanged')
+    parser.add_argument('--profile', action='store_true',
+                        help='record the time spent in each stage of the '
+                             'course code')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    failed = False
+    with concurrent.futures.ProcessPoolExecutor(
+            args.processes, initializer=_init_worker) as pool:
+        futures = {pool.submit(run_model, name, args.output_dir, args.force,
+                               args.profile): name for name in args.models}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                status, outputs = future.result()
+            except Exception as err:
+                print('{0}: failed ({1})'.format(name, err))
+                failed = True
+                continue
+            print('{0}: {1}, {2} files written'.format(name, status,
+                                                       len(outputs)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,486 @@
+"""
+Functions for analyzing mRNA copy number distributions measured by single
+molecule FISH in the physical biology of the cell course at Cold Spring
+Harbor Laboratories.
+
+The data files give, for each mRNA copy number n, the measured probability
+p(n) and its error bar. We compare them to three models of gene expression:
+
+    poisson : constitutive promoter with mean mu.
+    negative_binomial : bursty promoter with burst frequency and burst size
+        (both in units of the mRNA decay rate).
+    telegraph : promoter switching between an off and an on state with
+        rates k_on and k_off, transcribing at rate r when on (all in units of
+        the mRNA decay rate).
+
+Since the files report probabilities rather than the raw counts of cells,
+the likelihood of a model is computed as N * sum_n p(n) log q(n), where q(n)
+is the model distribution and N is the effective number of cells implied by
+the error bars (see `effective_cells`).
+"""
+import concurrent.futures
+import glob
+import hashlib
+import io
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import scipy.optimize
+import scipy.special
+
+
+def poisson_dist(mean, length):
+    """
+    A function to calculate the Poisson distribution. Note the distribution is
+    not normalized in the sense that if you sum over the output_array, the
+    result will not be 1; instead it respects the actual values the function
+    should take on the finite range of support.
+    Recall a Poisson distribution with mean mu has the form
+    p(n) = exp(-mu) * mu**n / n!
+
+    Parameters
+    ----------
+    mean : float or nd-array
+        The mean(s) of the distribution to calculate.
+    length : int
+        Length of support to cover (from 0 to length-1).
+
+    Returns
+    -------
+    output_array : nd-array
+        Array of probabilities with shape np.shape(mean) + (length,), so a
+        scalar mean gives a 1d-array over the support.
+    """
+    mean = np.asarray(mean, dtype=float)[..., np.newaxis]
+    m = np.arange(length)
+    # Computing in logs avoids the round-off errors of mu**n / n!. The log
+    # factorial log(n!) is gammaln(n + 1), and xlogy gives 0 * log(0) = 0 so
+    # that a zero mean puts all of the probability at n = 0.
+    log_prob = -mean + scipy.special.xlogy(m, mean) \
+                - scipy.special.gammaln(m + 1)
+    return np.exp(log_prob)
+
+
+def log_poisson(n, mu):
+    """
+    Log probability of n mRNAs for a Poisson distribution with mean mu.
+    """
+    return -mu + scipy.special.xlogy(n, mu) - scipy.special.gammaln(n + 1)
+
+
+def log_negative_binomial(n, burst_freq, burst_size):
+    """
+    Log probability of n mRNAs for a bursty promoter, which gives a negative
+    binomial distribution with shape burst_freq and mean
+    burst_freq * burst_size.
+    """
+    return scipy.special.gammaln(n + burst_freq) \
+           - scipy.special.gammaln(burst_freq) \
+           - scipy.special.gammaln(n + 1) \
+           - burst_freq * np.log1p(burst_size) \
+           + n * (np.log(burst_size) - np.log1p(burst_size))
+
+
+def _log_kummer_series(alpha, b, r):
+    """
+    Log of exp(-r) 1F1(alpha, b, r) for positive alpha, b and r, summed in
+    log space over the terms of the series around its largest term, so
+    that it neither overflows nor underflows.
+    """
+    def log_terms(j):
+        return scipy.special.gammaln(alpha + j) \
+               - scipy.special.gammaln(alpha) \
+               - scipy.special.gammaln(b + j) + scipy.special.gammaln(b) \
+               + j * np.log(r) - scipy.special.gammaln(j + 1)
+
+    # The ratio of consecutive terms (alpha + j) r / ((b + j) (j + 1))
+    # falls through one at the largest term, which is the positive root of
+    # a quadratic in j.
+    c = b + 1 - r
+    disc = c**2 - 4 * (b - r * alpha)
+    peak = int(max(0.0, (-c + np.sqrt(disc)) / 2)) if disc >= 0 else 0
+    # The terms fall off on either side of the peak over a few times
+    # sqrt(peak), so we add blocks of that size until they are negligible.
+    block = 64 + 4 * int(np.sqrt(peak))
+    blocks = [log_terms(np.arange(peak, peak + block, dtype=float))]
+    top = blocks[0].max()
+    while blocks[-1][-1] > top - 50:
+        start = peak + block * len(blocks)
+        blocks.append(log_terms(np.arange(start, start + block,
+                                          dtype=float)))
+    start = peak
+    while start > 0 and blocks[0][0] > top - 50:
+        j = np.arange(max(0, start - block), start, dtype=float)
+        blocks.insert(0, log_terms(j))
+        start = int(j[0])
+    return -r + scipy.special.logsumexp(np.concatenate(blocks))
+
+
+def log_hyp1f1_neg(a, b, r):
+    """
+    Log of the confluent hypergeometric function 1F1(a, b, -r) for positive
+    a <= b and r, which lies between zero and one.
+
+    scipy.special.hyp1f1 is used directly where it returns a value in that
+    range. Where it underflows or fails, which happens for some large r,
+    the value is found from Kummer's transformation
+    1F1(a, b, -r) = exp(-r) 1F1(b - a, b, r), whose series has only positive
+    terms, summed in log space.
+    """
+    a, b, r = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                    for x in (a, b, r)])
+    with np.errstate(all='ignore'):
+        hyp = scipy.special.hyp1f1(a, b, -r)
+        log_hyp = np.log(hyp)
+    # Results near the bottom of the floating point range have lost
+    # precision even when they are nonzero.
+    bad = ~(np.isfinite(log_hyp) & (hyp > 1e-290) & (hyp <= 1))
+    if np.any(bad):
+        log_hyp = np.array(log_hyp, dtype=float)
+        log_hyp[bad] = [_log_kummer_series(b_i - a_i, b_i, r_i)
+                        for a_i, b_i, r_i in zip(a[bad], b[bad], r[bad])]
+    return log_hyp
+
+
+def _log_rising(x, n, scale=1.0):
+    """
+    Log of the rising factorial x (x + 1) ... (x + n - 1) divided by
+    scale**n, for an array of integers n and scalar x. Summing the logs
+    avoids the cancellation between gammaln(x + n) and gammaln(x) when x is
+    large.
+    """
+    n = np.asarray(n, dtype=int)
+    terms = np.log((x + np.arange(np.max(n, initial=0))) / scale)
+    return np.concatenate([[0.0], np.cumsum(terms)])[n]
+
+
+def log_telegraph(n, k_on, k_off, r):
+    """
+    Log probability of n mRNAs in steady state for the two-state (telegraph)
+    promoter model with all rates in units of the mRNA decay rate.
+    """
+    a = k_on + n
+    b = k_on + k_off + n
+    # P(n) = (k_on)_n / (k_on + k_off)_n r^n / n! 1F1(a, b, -r), with the
+    # ratio r^n / (k_on + k_off)_n taken term by term so it stays accurate
+    # in the bursty limit of large k_off and r.
+    return _log_rising(k_on, n) - _log_rising(k_on + k_off, n, scale=r) \
+           - scipy.special.gammaln(n + 1) + log_hyp1f1_neg(a, b, r)
+
+
+def _poisson_guess(mean, var):
+    return [mean]
+
+
+def _negative_binomial_guess(mean, var):
+    burst_size = max(var / mean - 1, 1e-2)
+    return [mean / burst_size, burst_size]
+
+
+def _telegraph_from_bursts(burst_freq, burst_size):
+    # The negative binomial is the limit of the telegraph model in which the
+    # promoter turns off quickly (k_off large) and makes burst_size mRNAs
+    # per burst on average (r = burst_size * k_off).
+    k_off = 1e3 * (1 + burst_freq)
+    return [burst_freq, k_off, burst_size * k_off]
+
+
+def _telegraph_guess(mean, var):
+    return _telegraph_from_bursts(*_negative_binomial_guess(mean, var))
+
+
+# Log probability function, parameter names and initial guess from the mean
+# and variance of the data for each model.
+MODELS = {
+    'poisson': (log_poisson, ['mu'], _poisson_guess),
+    'negative_binomial': (log_negative_binomial,
+                          ['burst_freq', 'burst_size'],
+                          _negative_binomial_guess),
+    'telegraph': (log_telegraph, ['k_on', 'k_off', 'r'], _telegraph_guess),
+}
+
+
+def effective_cells(prob, err):
+    """
+    Estimates the number of cells behind a measured distribution from its
+    error bars, assuming binomial sampling error sqrt(p(1 - p) / N) on each
+    probability.
+
+    Parameters
+    ----------
+    prob : 1d-array
+        Measured probability of each copy number.
+    err : 1d-array
+        Error in each probability.
+
+    Returns
+    -------
+    n_cells : float
+        Median estimate of the number of cells over all copy numbers with a
+        nonzero probability and error.
+    """
+    prob = np.asarray(prob, dtype=float)
+    err = np.asarray(err, dtype=float)
+    good = (prob > 0) & (prob < 1) & (err > 0)
+    if not np.any(good):
+        raise ValueError('Cannot estimate the number of cells without '
+                         'nonzero probabilities and error bars.')
+    return np.median(prob[good] * (1 - prob[good]) / err[good]**2)
+
+
+def _hessian(func, x, eps=1e-4):
+    """
+    Numerical Hessian of a scalar function by central differences.
+    """
+    x = np.asarray(x, dtype=float)
+    num_params = len(x)
+    hess = np.empty((num_params, num_params))
+    shifts = eps * np.eye(num_params)
+    for i in range(num_params):
+        for j in range(i, num_params):
+            hess[i, j] = (func(x + shifts[i] + shifts[j])
+                          - func(x + shifts[i] - shifts[j])
+                          - func(x - shifts[i] + shifts[j])
+                          + func(x - shifts[i] - shifts[j])) / (4 * eps**2)
+            hess[j, i] = hess[i, j]
+    return hess
+
+
+def fit_distribution(prob, err=None, model='poisson', n_cells=None,
+                     confidence=0.95):
+    """
+    Fits a model of gene expression to a measured mRNA copy number
+    distribution by maximum likelihood.
+
+    Parameters
+    ----------
+    prob : 1d-array
+        Measured probability of each copy number, starting from zero.
+    err : 1d-array, optional
+        Error in each probability, used to estimate the number of cells if
+        `n_cells` is not given.
+    model : str, default 'poisson'
+        One of the keys of `MODELS`.
+    n_cells : float, optional
+        Number of cells measured. Sets the width of the confidence intervals.
+    confidence : float, default 0.95
+        Confidence level of the reported intervals.
+
+    Returns
+    -------
+    fit : dict
+        Dictionary with the model name, best fit parameter values, lower and
+        upper confidence bounds (each a dict keyed by parameter name), the
+        maximized log likelihood and the number of cells used.
+    """
+    log_pmf, param_names, guess = MODELS[model]
+    prob = np.asarray(prob, dtype=float)
+    prob = prob / np.sum(prob)
+    if n_cells is None:
+        if err is None:
+            raise ValueError('Either err or n_cells must be provided.')
+        n_cells = effective_cells(prob, err)
+    n = np.arange(len(prob))
+    mean = np.sum(n * prob)
+    var = np.sum(n**2 * prob) - mean**2
+    x0 = np.log(guess(mean, var))
+    if model == 'telegraph':
+        # Starting from the negative binomial fit, which the telegraph model
+        # contains as a limit, means the telegraph fit can only improve on
+        # it.
+        bursty = fit_distribution(prob, model='negative_binomial',
+                                  n_cells=n_cells)
+        x0 = np.log(_telegraph_from_bursts(**bursty['params']))
+
+    # Copy numbers that were never observed don't contribute to the
+    # likelihood, so we drop them up front.
+    observed = prob > 0
+    n, prob = n[observed], prob[observed]
+
+    # We optimize over the log of the parameters so they stay positive. The
+    # log likelihood is evaluated over the whole support in one call.
+    def neg_log_like(log_params):
+        with np.errstate(all='ignore'):
+            log_q = log_pmf(n, *np.exp(log_params))
+            value = -n_cells * np.sum(prob * log_q)
+        return value if np.isfinite(value) else np.inf
+
+    # The bounds keep the optimizer out of regions where a model has reached
+    # a limiting form, e.g. the telegraph model with k_off so large that it
+    # is indistinguishable from the negative binomial, and where the special
+    # functions lose accuracy.
+    log_min, log_max = np.log(1e-6), np.log(1e7)
+    x0 = np.clip(x0, log_min, log_max)
+    result = scipy.optimize.minimize(neg_log_like, x0, method='Nelder-Mead',
+                                     bounds=[(log_min, log_max)] * len(x0),
+                                     options={'xatol': 1e-6, 'fatol': 1e-10,
+                                              'maxiter': 5000})
+    best = result.x
+
+    # Confidence intervals from the curvature of the log likelihood, which
+    # are symmetric in log space and so never extend below zero.
+    z = scipy.special.ndtri(0.5 + confidence / 2)
+    with np.errstate(all='ignore'):
+        hess = _hessian(neg_log_like, best, eps=1e-3)
+        try:
+            std = np.sqrt(np.diag(np.linalg.inv(hess)))
+        except np.linalg.LinAlgError:
+            std = np.full(len(best), np.nan)
+    lower, upper = np.exp(best - z * std), np.exp(best + z * std)
+    # A parameter pinned at a bound is only limited by the data on one
+    # side, e.g. the telegraph k_off when the data are in the bursty limit.
+    lower[best < log_min + 1e-2] = 0
+    upper[best > log_max - 1e-2] = np.inf
+    return {'model': model,
+            'params': dict(zip(param_names, np.exp(best))),
+            'lower': dict(zip(param_names, lower)),
+            'upper': dict(zip(param_names, upper)),
+            'log_likelihood': -result.fun,
+            'n_cells': n_cells}
+
+
+def fit_gene(path, models=('poisson', 'negative_binomial', 'telegraph')):
+    """
+    Fits every model to the distribution in one smFISH data file.
+
+    Parameters
+    ----------
+    path : str
+        Path to a CSV file with 'Probability' and 'Error in probability'
+        columns.
+    models : sequence of str
+        Names of the models in `MODELS` to fit.
+
+    Returns
+    -------
+    rows : list of dict
+        One row per fitted parameter, ready to be turned into a DataFrame.
+    """
+    df = pd.read_csv(path)
+    gene = os.path.splitext(os.path.basename(path))[0]
+    return _fit_rows(gene, np.array(df['Probability']),
+                     np.array(df['Error in probability']), models)
+
+
+def _fit_rows(gene, prob, err, models):
+    rows = []
+    for model in models:
+        fit = fit_distribution(prob, err, model=model)
+        num_params = len(fit['params'])
+        for name, value in fit['params'].items():
+            rows.append({'gene': gene, 'model': model, 'parameter': name,
+                         'value': value, 'lower': fit['lower'][name],
+                         'upper': fit['upper'][name],
+                         'log_likelihood': fit['log_likelihood'],
+                         'aic': 2 * num_params - 2 * fit['log_likelihood'],
+                         'n_cells': fit['n_cells']})
+    return rows
+
+
+def fit_directory(directory, models=('poisson', 'negative_binomial',
+                                     'telegraph'), processes=None):
+    """
+    Fits every model to every smFISH data file in a directory, spreading the
+    genes across a pool of worker processes.
+
+    Parameters
+    ----------
+    directory : str
+        Directory containing one CSV file per gene.
+    models : sequence of str
+        Names of the models in `MODELS` to fit.
+    processes : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    df : pandas DataFrame
+        Tidy table with one row per gene, model and parameter.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, '*.csv')))
+    rows = []
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        for gene_rows in pool.map(fit_gene, paths,
+                                  [models] * len(paths)):
+            rows.extend(gene_rows)
+    return pd.DataFrame(rows)
+
+
+def _parse_csv(text):
+    """
+    Parses the text of one smFISH data file into typed arrays.
+    """
+    data = np.loadtxt(io.StringIO(text), delimiter=',', skiprows=1, ndmin=2)
+    return {'counts': data[:, 0].astype(int),
+            'prob': data[:, 1],
+            'err': data[:, 2]}
+
+
+def _zip_key(path):
+    """
+    Key identifying the contents of a zip file, from its size, modification
+    time and a hash of its central directory.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha1()
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            digest.update('{0}:{1}:{2};'.format(
+                    info.filename, info.CRC, info.file_size).encode())
+    return '{0}-{1}-{2}'.format(stat.st_size, stat.st_mtime_ns,
+                                digest.hexdigest())
+
+
+def load_zip(path='data/yeast_smFISH_data.zip', cache=True):
+    """
+    Loads every smFISH data file from a zip archive without extracting it.
+
+    Parameters
+    ----------
+    path : str
+        Path to the zip archive of CSV files, one per gene.
+    cache : bool, default True
+        If True, the parsed arrays are stored in a sidecar .npz file next to
+        the archive and reused on later calls as long as the archive has not
+        changed.
+
+    Returns
+    -------
+    data : dict
+        Dictionary keyed by gene name whose values are dictionaries with the
+        arrays 'counts', 'prob' and 'err'.
+    """
+    cache_path = os.path.splitext(path)[0] + '.npz'
+    key = _zip_key(path)
+    if cache and os.path.exists(cache_path):
+        with np.load(cache_path) as npz:
+            if str(npz['key']) == key:
+                genes = [str(gene) for gene in npz['genes']]
+                return {gene: {field: npz[gene + '/' + field]
+                               for field in ('counts', 'prob', 'err')}
+                        for gene in genes}
+
+    data = {}
+    with zipfile.ZipFile(path) as zf:
+        for name in sorted(zf.namelist()):
+            # Skip directories and the resource forks added by macOS.
+            base = os.path.basename(name)
+            if not base.endswith('.csv') or base.startswith('._') \
+                    or name.startswith('__MACOSX'):
+                continue
+            with zf.open(name) as member:
+                text = io.TextIOWrapper(member, encoding='utf-8').read()
+            data[os.path.splitext(base)[0]] = _parse_csv(text)
+
+    if cache:
+        arrays = {gene + '/' + field: values[field]
+                  for gene, values in data.items() for field in values}
+        try:
+            np.savez(cache_path, key=key, genes=np.array(sorted(data)),
+                     **arrays)
+        except OSError:
+            # A read-only data directory just means we don't cache.
+            pass
+    return data
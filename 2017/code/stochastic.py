@@ -0,0 +1,330 @@
+"""
+Stochastic simulation of chemical reactions for the physical biology of the
+cell course at Cold Spring Harbor Laboratories.
+
+The master equation tells us how the probability of each state changes in
+time. Alternatively, we can simulate many individual cells, each of which
+undergoes random reaction events, and build up the same distributions from
+the ensemble. Rather than loop over cells one at a time, the functions here
+advance every cell in the ensemble together with array operations, so that
+the cost in Python is set by the number of events per cell rather than the
+total number of events.
+
+A reaction system is described by a stoichiometry matrix, whose rows give
+the change in the copy number of each species when each reaction fires, and
+a propensity function, which takes a (cells x species) array of copy numbers
+and returns a (cells x reactions) array of reaction rates.
+
+`random_walk` does the same for walkers diffusing on a lattice of boxes, the
+particle-level picture behind `master_equation.master_eq`.
+"""
+import numpy as np
+
+import instrument
+
+
+def mrna_reactions(r, gamma):
+    """
+    Reaction system for constitutive mRNA production at rate r and decay at
+    rate gamma per molecule, as in constitutive_promoter.py and
+    mRNA_spreading_butter.py.
+
+    Returns
+    -------
+    stoich : 2d-array
+        Stoichiometry matrix of the two reactions for the one species.
+    propensity : function
+        Propensity function for use with `gillespie` or `tau_leap`.
+    """
+    stoich = np.array([[1], [-1]])
+
+    def propensity(x):
+        return np.column_stack((np.full(len(x), float(r)), gamma * x[:, 0]))
+    return stoich, propensity
+
+
+class _Recorder(object):
+    """
+    Accumulates the mean and variance of each species at each sample time,
+    and optionally the full samples and copy number histograms.
+    """
+    def __init__(self, num_cells, num_samples, num_species, return_samples,
+                 max_count):
+        self.sums = np.zeros((num_samples, num_species))
+        self.sums_sq = np.zeros((num_samples, num_species))
+        self.num_samples = num_samples
+        self.samples = None
+        if return_samples:
+            self.samples = np.empty((num_cells, num_samples, num_species),
+                                    dtype=int)
+        self.max_count = max_count
+        self.hist = None
+        if max_count is not None:
+            self.hist = np.zeros((num_species, max_count + 1, num_samples))
+
+    def record(self, cells, sample_index, x):
+        """
+        Records the states x of the given cells at the given sample indices.
+        """
+        for s in range(x.shape[1]):
+            self.sums[:, s] += np.bincount(sample_index, weights=x[:, s],
+                                           minlength=self.num_samples)
+            self.sums_sq[:, s] += np.bincount(sample_index,
+                                              weights=x[:, s]**2,
+                                              minlength=self.num_samples)
+            if self.hist is not None:
+                keep = x[:, s] <= self.max_count
+                flat = x[keep, s] * self.num_samples + sample_index[keep]
+                self.hist[s] += np.bincount(
+                        flat, minlength=self.hist[s].size).reshape(
+                            self.hist[s].shape)
+        if self.samples is not None:
+            self.samples[cells, sample_index] = x
+
+    def result(self, sample_times, num_cells):
+        mean = self.sums / num_cells
+        stats = {'time': sample_times,
+                 'mean': mean,
+                 'var': self.sums_sq / num_cells - mean**2}
+        if self.samples is not None:
+            stats['samples'] = self.samples
+        if self.hist is not None:
+            stats['prob'] = self.hist / num_cells
+        return stats
+
+
+def _setup(stoich, x0, sample_times, num_cells):
+    stoich = np.atleast_2d(np.asarray(stoich, dtype=int))
+    x0 = np.asarray(x0, dtype=int)
+    if x0.ndim == 2:
+        if len(x0) != num_cells:
+            raise ValueError('x0 must have one row per cell.')
+        x = x0.copy()
+    else:
+        x = np.tile(x0, (num_cells, 1))
+    if x.shape[1] != stoich.shape[1]:
+        raise ValueError('x0 must have one entry per column of stoich.')
+    sample_times = np.atleast_1d(np.asarray(sample_times, dtype=float))
+    if np.any(np.diff(sample_times) < 0):
+        raise ValueError('sample_times must be non-decreasing.')
+    return stoich, x, sample_times
+
+
+@instrument.timed()
+def gillespie(stoich, propensity, x0, sample_times, num_cells=1, seed=None,
+              return_samples=False, max_count=None):
+    """
+    Simulates an ensemble of independent cells exactly using the direct
+    method of Gillespie's stochastic simulation algorithm.
+
+    Parameters
+    ----------
+    stoich : 2d-array
+        Reactions x species matrix of the change in copy numbers when each
+        reaction fires.
+    propensity : function
+        Takes an N x species array of copy numbers and returns the
+        N x reactions array of reaction rates.
+    x0 : 1d-array or 2d-array
+        Initial copy number of each species, shared by every cell, or a
+        cells x species array giving the initial state of each cell.
+    sample_times : 1d-array
+        Non-decreasing times at which the state of each cell is recorded.
+    num_cells : int, default 1
+        Number of independent cells to simulate.
+    seed : int, optional
+        Seed for the random number generator.
+    return_samples : bool, default False
+        If True, also return the cells x times x species array of copy
+        numbers. This can be large for big ensembles.
+    max_count : int, optional
+        If given, also return the distribution of copy numbers 0 through
+        max_count of each species at each sample time.
+
+    Returns
+    -------
+    stats : dict
+        Dictionary with the sample 'time', the 'mean' and 'var' of each
+        species at each time (times x species), and, if requested, the
+        'samples' and the 'prob' array of shape species x (max_count + 1) x
+        times, laid out for `pboc_utils.bar3`.
+    """
+    rng = np.random.RandomState(seed)
+    stoich, x, sample_times = _setup(stoich, x0, sample_times, num_cells)
+    num_samples = len(sample_times)
+    recorder = _Recorder(num_cells, num_samples, x.shape[1], return_samples,
+                         max_count)
+    t = np.zeros(num_cells)
+    next_sample = np.zeros(num_cells, dtype=int)
+    active = np.arange(num_cells)
+
+    # Each pass through the loop fires one reaction in every active cell.
+    while len(active) > 0:
+        x_active = x[active]
+        rates = propensity(x_active)
+        total = rates.sum(axis=1)
+        # Waiting time to the next reaction. Cells in which no reaction can
+        # happen wait forever and so simply fill in their remaining samples.
+        with np.errstate(divide='ignore'):
+            tau = -np.log(rng.rand(len(active))) / total
+        t_next = t[active] + tau
+
+        # Record every sample time that falls before the next reaction.
+        while True:
+            pending = next_sample[active] < num_samples
+            due = np.zeros(len(active), dtype=bool)
+            due[pending] = sample_times[next_sample[active][pending]] \
+                           < t_next[pending]
+            if not np.any(due):
+                break
+            recorder.record(active[due], next_sample[active[due]],
+                            x_active[due])
+            next_sample[active[due]] += 1
+
+        # Cells with all of their samples recorded are done.
+        running = next_sample[active] < num_samples
+        active, rates, total = active[running], rates[running], total[running]
+        t[active] = t_next[running]
+
+        # Choose which reaction fires in each cell with probability
+        # proportional to its rate.
+        threshold = rng.rand(len(active)) * total
+        reaction = np.sum(np.cumsum(rates, axis=1) < threshold[:, np.newaxis],
+                          axis=1)
+        x[active] += stoich[reaction]
+    return recorder.result(sample_times, num_cells)
+
+
+@instrument.timed()
+def tau_leap(stoich, propensity, x0, sample_times, tau, num_cells=1,
+             seed=None, return_samples=False, max_count=None):
+    """
+    Simulates an ensemble of independent cells approximately by tau-leaping,
+    firing a Poisson-distributed number of each reaction in each time step
+    of length tau. This is much faster than `gillespie` when many reactions
+    happen per unit time, and accurate as long as the rates change little
+    over a step.
+
+    Parameters
+    ----------
+    stoich, propensity, x0, sample_times, num_cells, seed, return_samples,
+    max_count :
+        As for `gillespie`.
+    tau : float
+        Length of each leap.
+
+    Returns
+    -------
+    stats : dict
+        As for `gillespie`.
+
+    Notes
+    -----
+    Copy numbers that a leap would make negative are set to zero.
+    """
+    rng = np.random.RandomState(seed)
+    stoich, x, sample_times = _setup(stoich, x0, sample_times, num_cells)
+    num_samples = len(sample_times)
+    recorder = _Recorder(num_cells, num_samples, x.shape[1], return_samples,
+                         max_count)
+    cells = np.arange(num_cells)
+    t = 0.0
+    next_sample = 0
+    while next_sample < num_samples:
+        # Every cell shares the same clock, so samples are recorded for the
+        # whole ensemble at once.
+        while next_sample < num_samples \
+                and sample_times[next_sample] < t + tau / 2:
+            recorder.record(cells, np.full(num_cells, next_sample), x)
+            next_sample += 1
+        if next_sample == num_samples:
+            break
+        firings = rng.poisson(propensity(x) * tau)
+        x += firings.dot(stoich)
+        np.maximum(x, 0, out=x)
+        t += tau
+    return recorder.result(sample_times, num_cells)
+
+
+@instrument.timed()
+def random_walk(p0, k, dt, time_points, num_walkers, boundary='reflecting',
+                stride=1, chunk_size=10**6, seed=None):
+    """
+    Simulates an ensemble of independent random walkers on a lattice of
+    boxes and returns the fraction of walkers in each box over time. In
+    each time step of length dt, a walker hops one box to the left with
+    probability k*dt, one box to the right with probability k*dt, and stays
+    put otherwise, so the occupancy converges to the solution of `master_eq`
+    as the number of walkers grows.
+
+    Parameters
+    ----------
+    p0 : int or 1d-array
+        Either the starting box of every walker, or the probability of
+        starting in each box. If an int is given, the lattice has
+        `num_boxes = 2 * p0 + 1` boxes so the walkers start in the middle.
+    k : float
+        Hopping rate of the walkers in units of 1/s.
+    dt : float
+        Time step. k*dt must be at most 1/2.
+    time_points : int
+        Total number of time points, including the initial condition.
+    num_walkers : int
+        Number of walkers to simulate.
+    boundary : str, default 'reflecting'
+        'reflecting' walkers that try to hop off the lattice stay in the end
+        box, as in `master_eq`. 'absorbing' walkers that hop off the lattice
+        are removed.
+    stride : int, default 1
+        Record the occupancy every `stride` time points.
+    chunk_size : int, default 10**6
+        Maximum number of walkers held in memory at once. Larger ensembles
+        are simulated one chunk after another.
+    seed : int, optional
+        Seed for the random number generator.
+
+    Returns
+    -------
+    time_vec : 1d-array
+        Times at which the occupancy was recorded.
+    occupancy : 2d-array
+        num_boxes x len(time_vec) array of the fraction of all walkers in
+        each box, laid out like the probabilities of `master_eq`. With
+        absorbing boundaries the columns sum to the surviving fraction.
+    """
+    if boundary not in ('reflecting', 'absorbing'):
+        raise ValueError("boundary must be 'reflecting' or 'absorbing'.")
+    if k * dt > 0.5:
+        raise ValueError('k*dt must be at most 1/2.')
+    rng = np.random.RandomState(seed)
+    if np.ndim(p0) == 0:
+        num_boxes = 2 * int(p0) + 1
+        start_prob = np.zeros(num_boxes)
+        start_prob[int(p0)] = 1
+    else:
+        start_prob = np.asarray(p0, dtype=float)
+        num_boxes = len(start_prob)
+        start_prob = start_prob / start_prob.sum()
+
+    record_steps = np.arange(0, time_points, stride)
+    occupancy = np.zeros((num_boxes, len(record_steps)))
+    for first in range(0, num_walkers, chunk_size):
+        n = min(chunk_size, num_walkers - first)
+        position = rng.choice(num_boxes, size=n, p=start_prob)
+        for i in range(time_points):
+            if i > 0:
+                # One uniform number per walker decides left, right or stay.
+                u = rng.rand(len(position))
+                position += (u > 1 - k * dt).astype(position.dtype) \
+                            - (u < k * dt)
+                if boundary == 'reflecting':
+                    np.clip(position, 0, num_boxes - 1, out=position)
+                else:
+                    position = position[(position >= 0)
+                                        & (position < num_boxes)]
+            # Histogram the walkers on the fly rather than storing their
+            # trajectories.
+            if i % stride == 0:
+                occupancy[:, i // stride] += np.bincount(position,
+                                                         minlength=num_boxes)
+    return record_steps * dt, occupancy / num_walkers
@@ -0,0 +1,46 @@
+"""
+Tests of the instrumentation hooks in instrument.py. Run with
+`python -m pytest` from this directory.
+"""
+import numpy as np
+import pytest
+
+import frap
+import instrument
+import master_equation
+
+
+def test_nothing_recorded_when_disabled():
+    instrument.disable()
+    instrument.reset()
+    model = master_equation.mrna_model(2, 1 / 3, 20)
+    master_equation.collect(model.stream(model.initial(), 0.05, 100))
+    assert instrument.report() == {}
+
+
+def test_stream_steps_counted():
+    model = master_equation.mrna_model(2, 1 / 3, 20)
+    with instrument.recording():
+        master_equation.collect(model.stream(model.initial(), 0.05, 100))
+    record = instrument.report()['stream.step']
+    assert record['calls'] == 99
+    assert record['bytes'] == 99 * 21 * 8
+    assert not instrument.is_enabled()
+
+
+def test_dct_propagate_times_each_snapshot():
+    field = np.random.default_rng(0).random((64, 64))
+    times = np.linspace(0, 1, 20)
+    with instrument.recording():
+        snapshots = list(frap.dct_propagate(field, 1.0, times))
+    report = instrument.report()
+    assert report['dct_propagate.transform']['calls'] == 1
+    assert report['dct_propagate.snapshot']['calls'] == len(snapshots)
+    assert report['dct_propagate.snapshot']['seconds'] > 0
+
+
+def test_timed_rejects_generators():
+    with pytest.raises(TypeError):
+        @instrument.timed()
+        def snapshots():
+            yield 1
@@ -0,0 +1,45 @@
+"""
+Tests of the master equation integrators in master_equation.py. Run with
+`python -m pytest` from this directory.
+"""
+import numpy as np
+import pytest
+
+import master_equation
+from benchmarks.reference import initial_condition, master_eq_loop
+
+
+@pytest.mark.parametrize('num_boxes, time_points',
+                         [(100, 100), (15, 200), (3, 50)])
+def test_master_eq_matches_loop(num_boxes, time_points):
+    # The in-class examples must give bit-identical results.
+    k, dt = 1e5, 1e-6
+    ref = master_eq_loop(initial_condition(num_boxes, time_points), k, dt)
+    vec = master_equation.master_eq(initial_condition(num_boxes, time_points),
+                                    k, dt)
+    np.testing.assert_array_equal(ref, vec)
+
+
+def test_master_eq_matches_loop_frap():
+    # FRAP-style initial condition from the in-class script
+    k, dt = 1e5, 1e-6
+    frap = np.zeros((15, 200))
+    frap[:, 0] = 1 / 8
+    frap[4:11, 0] = 0
+    ref = master_eq_loop(frap.copy(), k, dt)
+    vec = master_equation.master_eq(frap.copy(), k, dt)
+    np.testing.assert_array_equal(ref, vec)
+
+
+def test_crank_nicolson_warns_beyond_positivity_limit():
+    # dt * max exit rate = 3.3e3 here, far beyond the limit of 2.
+    model = master_equation.mrna_model(2, 1 / 3, 2000)
+    with pytest.warns(UserWarning, match='backward_euler'):
+        model.stepper(5, method='crank_nicolson')
+
+
+def test_solve_adaptive_at_time_zero():
+    model = master_equation.mrna_model(2, 1 / 3, 20)
+    p0 = model.initial()
+    prob = master_equation.solve_adaptive(model.generator, p0, [0])
+    np.testing.assert_array_equal(prob, p0[:, np.newaxis])
@@ -0,0 +1,143 @@
+"""
+Tests of the plotting and image analysis functions in pboc_utils.py. Run
+with `python -m pytest` from this directory.
+"""
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+import skimage.measure
+
+import master_equation
+import pboc_utils
+from benchmarks.reference import (extract_intensities_loop,
+                                  phase_segmentation_loop)
+from benchmarks.synthetic import synthetic_field, synthetic_phase_image
+
+
+def _plotted(data, **kwargs):
+    # the values drawn by bar3, read back from its heatmap
+    _, ax = pboc_utils.bar3(data, mode='heatmap', **kwargs)
+    return np.asarray(ax.collections[0].get_array()).reshape(-1)
+
+
+@pytest.fixture(autouse=True)
+def close_figures():
+    yield
+    plt.close('all')
+
+
+def test_bar3_accepts_array_like():
+    # A nested list is a 2 x 2 array, not a stream of (y, z) pairs.
+    data = [[1.0, 2.0], [3.0, 4.0]]
+    assert np.allclose(_plotted(data), [1, 2, 3, 4])
+
+
+def test_bar3_stream_matches_array():
+    model = master_equation.mrna_model(2, 1 / 3, 20)
+    time_vec, prob = master_equation.collect(
+            model.stream(model.initial(), 0.05, 50))
+    from_array = _plotted(prob, y_vec=time_vec, bin_step=5)
+    from_stream = _plotted(model.stream(model.initial(), 0.05, 50),
+                           bin_step=5)
+    assert np.allclose(from_array, from_stream)
+
+
+def test_bar3_thins_long_streams():
+    # A stream much longer than max_slices is thinned as it arrives, so
+    # only a bounded number of snapshots is ever held.
+    held = []
+
+    def snapshots():
+        for i in range(100000):
+            held.append(i)
+            yield float(i), np.full(3, float(i))
+
+    values = _plotted(snapshots(), max_slices=50).reshape(3, -1)
+    assert 25 < values.shape[1] <= 50
+    # every plotted snapshot is a multiple of the final spacing
+    spacing = values[0, 1] - values[0, 0]
+    assert np.allclose(np.diff(values[0]), spacing)
+    assert values[0, 0] == 0
+
+
+@pytest.mark.parametrize('num_cells, area_bounds',
+                         [(100, [1, 3]), (400, [1, 3]), (400, [0.5, 2])])
+def test_phase_segmentation_matches_loop(num_cells, area_bounds):
+    # The bincount area screen must give exactly the original mask.
+    image = synthetic_phase_image(num_cells, size=512)
+    ref = phase_segmentation_loop(image, -0.2, area_bounds=area_bounds)
+    seg = pboc_utils.phase_segmentation(image, -0.2,
+                                        area_bounds=area_bounds)
+    assert seg.max() > 0
+    np.testing.assert_array_equal(ref, seg)
+
+
+def test_extract_features_matches_regionprops():
+    seg, fluo_im = synthetic_field(500, size=512)
+    fluo_ims = {'a': fluo_im, 'b': fluo_im.astype(float)**2}
+    features = pboc_utils.extract_features(seg, fluo_ims)
+    props = skimage.measure.regionprops(seg)
+    np.testing.assert_array_equal(features['label'],
+                                  [obj.label for obj in props])
+    np.testing.assert_array_equal(features['area'],
+                                  [obj.area for obj in props])
+    for name, im in fluo_ims.items():
+        np.testing.assert_allclose(features[name + '_mean'],
+                                   extract_intensities_loop(seg, im),
+                                   rtol=1e-12)
+        pixels = [im[seg == obj.label] for obj in props]
+        np.testing.assert_allclose(features[name + '_total'],
+                                   [p.sum() for p in pixels], rtol=1e-12)
+        np.testing.assert_allclose(features[name + '_var'],
+                                   [p.var() for p in pixels], rtol=1e-8,
+                                   atol=1e-12)
+
+
+def test_extract_intensities_matches_regionprops():
+    seg, fluo_im = synthetic_field(500, size=512)
+    np.testing.assert_allclose(pboc_utils.extract_intensities(seg, fluo_im),
+                               extract_intensities_loop(seg, fluo_im),
+                               rtol=1e-12)
+
+
+def _background_test_images():
+    # a phase contrast image and images that put sharp features against the
+    # edges, where the background estimators differ most
+    image = synthetic_phase_image(400, size=512)
+    yield (image - image.min()) / (image.max() - image.min())
+    corner = np.zeros((600, 600))
+    corner[:20, :20] = 1
+    yield corner
+    edge = np.zeros((600, 600))
+    edge[:, :300] = 1
+    yield edge
+    rng = np.random.RandomState(0)
+    for block in [30, 60]:
+        blocks = rng.randint(0, 2, (600 // block, 600 // block))
+        yield np.kron(blocks, np.ones((block, block)))
+
+
+@pytest.mark.parametrize('method, sigma, bound',
+                         [('fft', 50.0, 1e-12), ('box', 50.0, 0.044),
+                          ('box', 8.0, 0.09), ('box', 3.0, 0.14),
+                          ('downsample', 50.0, 0.12)])
+def test_estimate_background_within_documented_bound(method, sigma, bound):
+    for im_float in _background_test_images():
+        ref = pboc_utils.estimate_background(im_float, sigma,
+                                             method='gaussian')
+        est = pboc_utils.estimate_background(im_float, sigma, method=method)
+        assert np.abs(est - ref).max() < bound
+
+
+@pytest.mark.parametrize('x_length', [200, 201, 401, 450])
+def test_bar3_max_bins_keeps_every_row(x_length):
+    # Rows beyond the last full block are averaged into a final partial bar
+    # rather than dropped.
+    data = np.arange(x_length, dtype=float)[:, np.newaxis] * np.ones(3)
+    values = _plotted(data).reshape(-1, 3)[:, 0]
+    block = int(np.ceil(x_length / 200))
+    assert len(values) == int(np.ceil(x_length / block))
+    assert values[-1] == np.mean(np.arange(x_length)[
+            (len(values) - 1) * block:])
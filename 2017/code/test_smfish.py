@@ -0,0 +1,46 @@
+"""
+Tests of the smFISH model fits in smfish.py. Run with `python -m pytest`
+from this directory.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import smfish
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                    'yeast_smFISH_data.zip')
+
+
+def test_log_telegraph_large_r_is_normalized():
+    # r above ~710 used to overflow scipy.special.hyp1f1 to inf.
+    log_p = smfish.log_telegraph(np.arange(400), 2.0, 160.0, 800.0)
+    assert np.all(np.isfinite(log_p))
+    assert np.all(log_p < 0)
+    assert np.isclose(np.sum(np.exp(log_p)), 1)
+
+
+def test_log_telegraph_bursty_limit():
+    # With k_off large and r = burst_size * k_off, the telegraph model
+    # becomes the negative binomial.
+    n = np.arange(60)
+    burst_freq, burst_size, k_off = 3.0, 4.5, 1e6
+    log_tele = smfish.log_telegraph(n, burst_freq, k_off, burst_size * k_off)
+    log_nb = smfish.log_negative_binomial(n, burst_freq, burst_size)
+    assert np.allclose(log_tele, log_nb, atol=1e-4)
+
+
+@pytest.mark.skipif(not os.path.exists(DATA), reason='smFISH data missing')
+def test_telegraph_fit_at_least_negative_binomial():
+    # The negative binomial is a limit of the telegraph model, so the
+    # telegraph fit can only match or improve on it. The small tolerance
+    # allows for k_off being finite at the bound of the fit.
+    for gene, data in smfish.load_zip(DATA, cache=False).items():
+        bursty = smfish.fit_distribution(data['prob'], data['err'],
+                                         model='negative_binomial')
+        tele = smfish.fit_distribution(data['prob'], data['err'],
+                                       model='telegraph')
+        assert tele['log_likelihood'] >= bursty['log_likelihood'] - 1e-4, \
+            gene
+        assert np.all(np.isfinite(list(tele['params'].values())))